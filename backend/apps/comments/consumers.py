@@ -0,0 +1,53 @@
+from channels.db import database_sync_to_async
+
+from apps.posts.models import Post
+from config.streams import EventStreamConsumer, publish
+
+from .serializers import CommentSerializer
+
+
+def post_group(post_id):
+    return f'post_comments_{post_id}'
+
+
+def publish_comment_created(comment):
+    """Push a new comment and the post's comment count to live viewers"""
+    publish(post_group(comment.post_id), 'comment.created', {
+        'comment': CommentSerializer(comment).data,
+        'comments_count': Post.objects.values_list(
+            'comments_count', flat=True
+        ).get(pk=comment.post_id),
+    })
+
+
+def publish_comment_deleted(comment):
+    publish(post_group(comment.post_id), 'comment.deleted', {
+        'id': comment.id,
+        'parent': comment.parent_id,
+        'comments_count': Post.objects.values_list(
+            'comments_count', flat=True
+        ).get(pk=comment.post_id),
+    })
+
+
+class CommentStreamConsumer(EventStreamConsumer):
+    """Server-sent events for comments created and deleted on one post"""
+
+    @database_sync_to_async
+    def can_view(self, user, post_id):
+        from .views import CommentViewSet
+
+        post = Post.objects.filter(id=post_id, is_deleted=False).first()
+        return post is not None and CommentViewSet()._can_view_post(user, post)
+
+    async def get_groups(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.send_json_response(401, {'error': 'Authentication required'})
+            return None
+
+        post_id = self.scope['url_route']['kwargs']['post_id']
+        if not await self.can_view(user, post_id):
+            await self.send_json_response(404, {'error': 'Post not found'})
+            return None
+        return [post_group(post_id)]
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from apps.comments.models import Comment
+
+
+class Command(BaseCommand):
+    help = "Recompute materialized thread paths and depths for comments"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--post',
+            type=int,
+            action='append',
+            dest='post_ids',
+            help='Only rebuild comments on this post ID (can be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        comments = Comment.objects.all()
+        if options['post_ids']:
+            comments = comments.filter(post_id__in=options['post_ids'])
+
+        parents = dict(comments.values_list('id', 'parent_id').iterator())
+        positions = {}
+
+        def position(comment_id):
+            # Walk up to the nearest ancestor with a known position
+            chain = []
+            while comment_id not in positions:
+                chain.append(comment_id)
+                parent_id = parents.get(comment_id)
+                if parent_id is None:
+                    break
+                comment_id = parent_id
+            path, depth = positions.get(comment_id, ('', -1))
+            for ancestor_id in reversed(chain):
+                depth += 1
+                path += Comment.path_segment(ancestor_id)
+                positions[ancestor_id] = (path, depth)
+            return positions[chain[0]] if chain else positions[comment_id]
+
+        updated = []
+        for comment_id in parents:
+            path, depth = position(comment_id)
+            updated.append(Comment(id=comment_id, path=path, depth=depth))
+
+        Comment.objects.bulk_update(updated, ['path', 'depth'], batch_size=1000)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt paths for {len(updated)} comments"))
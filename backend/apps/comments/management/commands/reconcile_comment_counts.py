@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from apps.comments.models import Comment
+from apps.posts.models import Post
+
+BATCH_SIZE = 1000
+
+
+def visible_count(**filters):
+    """Subquery counting visible comments matching filters"""
+    return Coalesce(Subquery(
+        Comment.objects.filter(is_deleted=False, **filters).order_by().values(
+            *filters
+        ).annotate(total=Count('id')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = "Repair drift in denormalized comments_count and replies_count"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--post',
+            type=int,
+            action='append',
+            dest='post_ids',
+            help='Only reconcile this post ID and its comments (can be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all()
+        comments = Comment.objects.all()
+        if options['post_ids']:
+            posts = posts.filter(id__in=options['post_ids'])
+            comments = comments.filter(post_id__in=options['post_ids'])
+
+        fixed_posts = self.reconcile(
+            posts, 'comments_count', visible_count(post=OuterRef('pk'))
+        )
+        fixed_comments = self.reconcile(
+            comments, 'replies_count', visible_count(parent=OuterRef('pk'))
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Fixed {fixed_posts} post and {fixed_comments} comment counters"
+        ))
+
+    def reconcile(self, queryset, field, actual):
+        """Rewrite `field` on rows where it differs from `actual`, in batches"""
+        drifted = queryset.annotate(actual=actual).exclude(
+            **{field: F('actual')}
+        ).values_list('id', flat=True)
+
+        # Drift is rare, so the IDs to fix are small enough to hold
+        drifted = list(drifted)
+        fixed = 0
+        for start in range(0, len(drifted), BATCH_SIZE):
+            fixed += queryset.model.objects.filter(
+                id__in=drifted[start:start + BATCH_SIZE]
+            ).update(**{field: actual})
+        return fixed
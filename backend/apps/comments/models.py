@@ -1,15 +1,24 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from django.db.models import F, Window
+from django.db.models.functions import Greatest, RowNumber
 from django.contrib.auth import get_user_model
 from apps.posts.models import Post
 
 User = get_user_model()
 
+# Materialized paths: one fixed-width, zero-padded ID per level, so sorting
+# by path walks a thread depth-first with siblings oldest first
+PATH_STEP = 10
+MAX_DEPTH = 24
+
 class Comment(models.Model):
     """Comments on posts with nested reply support"""
 
     post = models.ForeignKey(
         Post,
-        related_name='commentst',
+        related_name='comments',
         on_delete=models.CASCADE
     )
     author = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -28,8 +37,14 @@ class Comment(models.Model):
         related_name='replies'
     )
 
+    # Thread position: ancestors' IDs then our own, and nesting level
+    path = models.CharField(max_length=PATH_STEP * (MAX_DEPTH + 1), blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
     # Engagement
     likes_count = models.PositiveIntegerField(default=0)
+    replies_count = models.PositiveIntegerField(default=0)  # visible direct replies
+    reaction_counts = models.JSONField(default=dict, blank=True)  # {'love': 3, ...}
 
     # Soft delete
     is_deleted = models.BooleanField(default=False)
@@ -39,6 +54,7 @@ class Comment(models.Model):
         indexes = [
             models.Index(fields=['post', 'created_at']),
             models.Index(fields=['parent']),
+            models.Index(fields=['post', 'path']),
             models.Index(fields=['author']),
         ]
 
@@ -46,22 +62,133 @@ class Comment(models.Model):
         content_preview = self.content[:50] + '...' if len(self.content) > 50 else self.content
         return f"{self.author.username}: {content_preview}"
     
+    # is_deleted as last read from or written to the database
+    _stored_is_deleted = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored state so save() can tell what changed
+        instance._stored_is_deleted = instance.__dict__.get('is_deleted')
+        return instance
+
+    @classmethod
+    def _newest_per(cls, field, ids, limit):
+        """
+        Newest `limit` visible comments for each value of `field` in one
+        query, using ROW_NUMBER() OVER (PARTITION BY field)
+        """
+        comments = cls.objects.filter(
+            **{f'{field}__in': ids},
+            is_deleted=False
+        ).select_related('author').annotate(
+            position=Window(
+                expression=RowNumber(),
+                partition_by=[F(field)],
+                order_by=[F('created_at').desc(), F('id').desc()]
+            )
+        ).filter(position__lte=limit).order_by(field, 'position')
+
+        newest = {value: [] for value in ids}
+        for comment in comments:
+            newest[getattr(comment, field)].append(comment)
+        return newest
+
+    @classmethod
+    def get_recent_for_posts(cls, post_ids, limit=3):
+        """Newest `limit` comments of every post, with authors joined in"""
+        return cls._newest_per('post_id', post_ids, limit)
+
+    @classmethod
+    def get_recent_replies(cls, parent_ids, limit=5):
+        """Newest `limit` replies of every parent, with authors joined in"""
+        return cls._newest_per('parent_id', parent_ids, limit)
+
+    @staticmethod
+    def path_segment(comment_id):
+        return str(comment_id).zfill(PATH_STEP)
+
+    @classmethod
+    def get_thread(cls, post_id, root=None, max_depth=None):
+        """
+        Comments of a post, or of root's subtree, in thread order.
+        max_depth counts levels below the root (or below top level).
+        """
+        comments = cls.objects.filter(post_id=post_id, is_deleted=False)
+        base_depth = 0
+        if root is not None:
+            # Every descendant's path lies in [root.path, root.path + ':')
+            comments = comments.filter(path__gte=root.path, path__lt=root.path + ':')
+            base_depth = root.depth
+        if max_depth is not None:
+            comments = comments.filter(depth__lte=base_depth + max_depth)
+        return comments.select_related('author').order_by('path')
+
     @property
     def is_reply(self):
         return self.parent is not None
     
-    @property
-    def replies_count(self):
-        return self.replies.filter(is_deleted=False).count()
-
     def save(self, *args, **kwargs):
         is_new = self.pk is None
-        super().save(*args, **kwargs)
-
-        # Update post comment count if this is a new comment
-        if is_new and not self.is_deleted:
-            self.post.comments_count = Comment.objects.filter(
-                post=self.post,
-                is_deleted=False
-            ).count()
-            self.post.save(update_fields=['comments_count'])
\ No newline at end of file
+        update_fields = kwargs.get('update_fields')
+        writes_deleted = update_fields is None or 'is_deleted' in update_fields
+
+        with transaction.atomic():
+            # A new comment counts as moving from deleted to its current state
+            was_deleted = True if is_new else self.is_deleted
+            if not is_new and writes_deleted and self._stored_is_deleted != self.is_deleted:
+                # Re-read under a row lock so racing deletes are counted once
+                was_deleted = Comment.objects.select_for_update().values_list(
+                    'is_deleted', flat=True
+                ).get(pk=self.pk)
+
+            super().save(*args, **kwargs)
+            self._stored_is_deleted = self.is_deleted
+
+            # The path ends with our own ID, which only exists after the insert
+            if is_new:
+                self.path = self.path_segment(self.pk)
+                self.depth = 0
+                if self.parent_id:
+                    self.path = self.parent.path + self.path
+                    self.depth = self.parent.depth + 1
+                Comment.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+
+            if was_deleted != self.is_deleted:
+                self._adjust_counters(-1 if self.is_deleted else 1)
+
+    def soft_delete(self):
+        self.is_deleted = True
+        self.save(update_fields=['is_deleted', 'updated_at'])
+
+    def restore(self):
+        self.is_deleted = False
+        self.save(update_fields=['is_deleted', 'updated_at'])
+
+    def _adjust_counters(self, delta):
+        """
+        Move the post's comments_count and the parent's replies_count by
+        delta, never below zero
+        """
+        Post.objects.filter(pk=self.post_id).update(
+            comments_count=Greatest(F('comments_count') + delta, 0)
+        )
+        if self.parent_id:
+            Comment.objects.filter(pk=self.parent_id).update(
+                replies_count=Greatest(F('replies_count') + delta, 0)
+            )
+
+
+@receiver(pre_delete, sender=Comment)
+def uncount_deleted_comment(sender, instance, origin=None, **kwargs):
+    """
+    Take a hard-deleted comment out of its post's and parent's counters.
+    Runs for every comment a delete cascades to (replies of a deleted
+    comment, comments of a deleted user), not only the one deleted.
+    """
+    if instance.is_deleted:
+        return
+    # The post and all its comments are going, counters included
+    if isinstance(origin, Post) and origin.pk == instance.post_id:
+        return
+    instance._adjust_counters(-1)
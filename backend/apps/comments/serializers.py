@@ -1,10 +1,13 @@
 from rest_framework import serializers
-from django.contrib.contenttypes.models import ContentType
-from .models import Comment
+from .models import MAX_DEPTH, Comment
 from apps.users.serializers import UserListSerializer
-from apps.likes.models import Like
+from apps.likes.serializers import (
+    BufferedCountersMixin,
+    ViewerReactionMixin,
+    ViewerStateListSerializer
+)
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(BufferedCountersMixin, ViewerReactionMixin, serializers.ModelSerializer):
     """Serializer for reading comments"""
     author = UserListSerializer(read_only=True)
     replies_count = serializers.ReadOnlyField()
@@ -14,40 +17,14 @@ class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = [
-            'id', 'author', 'content', 'parent', 'likes_count',
-            'replies_count', 'user_has_liked', 'user_reaction',
+            'id', 'author', 'content', 'parent', 'depth', 'likes_count',
+            'reaction_counts', 'replies_count', 'user_has_liked', 'user_reaction',
             'created_at', 'updated_at'
         ]
+        list_serializer_class = ViewerStateListSerializer
 
-    def get_user_has_liked(self, obj):
-        """Check if the current user has liked this comment"""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            content_type = ContentType.objects.get_for_model(Comment)
-            return Like.objects.filter(
-                user=request.user,
-                content_type=content_type,
-                object_id=obj.id
-            ).exists()
-        return False
-    
-    def get_user_reaction(self, obj):
-        """Gets current user's reaction to this comment"""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            content_type = ContentType.objects.get_for_model(Comment)
-            try:
-                like = Like.objects.get(
-                    user=request.user,
-                    content_type=content_type,
-                    object_id=obj.id
-                )
-                return like.reaction_type
-            except Like.DoesNotExist:
-                return None
-        return None
-    
-class NestedCommentSerializer(serializers.ModelSerializer):
+
+class NestedCommentSerializer(BufferedCountersMixin, ViewerReactionMixin, serializers.ModelSerializer):
     """Serializer for comments with their replies"""
     replies = serializers.SerializerMethodField()
     author = UserListSerializer(read_only=True)
@@ -59,43 +36,30 @@ class NestedCommentSerializer(serializers.ModelSerializer):
         model = Comment
         fields = [
             'id', 'author', 'content', 'parent', 'likes_count',
-            'replies_count', 'replies', 'user_has_liked', 
+            'reaction_counts', 'replies_count', 'replies', 'user_has_liked', 
             'user_reaction', 'created_at', 'updated_at'
-        ]   
-    
-    def get_replies(self, obj):
-        if obj.replies.filter(is_deleted=False).exists():
-            replies = obj.replies.filter(is_deleted=False)[:5] # Limit replies
-            return CommentSerializer(replies, many=True, context=self.context).data
-        return []
+        ]
+        list_serializer_class = ViewerStateListSerializer
     
-    def get_user_has_liked(self, obj):
-        """Check if the current user has liked this comment"""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            content_type = ContentType.objects.get_for_model(Comment)
-            return Like.objects.filter(
-                user=request.user,
-                content_type=content_type,
-                object_id=obj.id
-            ).exists()
-        return False
+    def preload(self, instances):
+        """Load the first replies of the page, and the viewer's reactions to all of it"""
+        recent = Comment.get_recent_replies([
+            comment.id for comment in instances if comment.replies_count
+        ])
+        self.context.setdefault('recent_replies', {}).update(recent)
+        super().preload(
+            list(instances) + [reply for replies in recent.values() for reply in replies]
+        )
 
-    def get_user_reaction(self, obj):
-        """Gets current user's reaction to this comment"""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            content_type = ContentType.objects.get_for_model(Comment)
-            try:
-                like = Like.objects.get(
-                    user=request.user,
-                    content_type=content_type,
-                    object_id=obj.id
-                )
-                return like.reaction_type
-            except Like.DoesNotExist:
-                return None
-        return None
+    def get_replies(self, obj):
+        if not obj.replies_count:
+            return []
+        replies = self.context.get('recent_replies', {}).get(obj.id)
+        if replies is None:
+            replies = obj.replies.filter(
+                is_deleted=False
+            ).select_related('author')[:5] # Limit replies
+        return CommentSerializer(replies, many=True, context=self.context).data
 
 
 class CreateCommentSerializer(serializers.ModelSerializer):
@@ -118,6 +82,8 @@ class CreateCommentSerializer(serializers.ModelSerializer):
             # Check if parent comment exists and not deleted
             if value.is_deleted:
                 raise serializers.ValidationError('Cannot reply to a deleted comment')
+            if value.depth >= MAX_DEPTH:
+                raise serializers.ValidationError('Reply thread is too deep')
             # For now, we'll set the post in the view
             # Later we can validate parent belongs to same post
         return value
@@ -1,8 +1,20 @@
+from io import StringIO
+from unittest import mock
+
 from django.test import TestCase
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from rest_framework.response import Response
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.core.management import call_command
+from rest_framework_simplejwt.tokens import AccessToken
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.exceptions import ImproperlyConfigured
+
+from config.streams import EventStreamConsumer
 
 from .models import Comment
 from apps.posts.models import Post
@@ -77,7 +89,7 @@ class CommentTestCase(TestCase):
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 2)
-        self.assertEqual(response.data['count'], 2)
+        self.assertIsNone(response.data['next'])
 
     def test_update_comment(self):
         """Test updating a comment"""
@@ -195,4 +207,234 @@ class CommentTestCase(TestCase):
         self.client.post(f'/api/posts/{self.post.id}/comments/', data)
         
         self.post.refresh_from_db()
-        self.assertEqual(self.post.comments_count, initial_count + 1)
\ No newline at end of file
+        self.assertEqual(self.post.comments_count, initial_count + 1)
+
+    def _thread(self):
+        """root -> (a -> a1, b), plus a second top-level comment"""
+        comments = {}
+        for name, parent in [('root', None), ('a', 'root'), ('second', None),
+                             ('b', 'root'), ('a1', 'a')]:
+            comments[name] = Comment.objects.create(
+                post=self.post,
+                author=self.user,
+                content=name,
+                parent=comments.get(parent)
+            )
+        return comments
+
+    def test_get_thread(self):
+        """Test a thread loads in depth-first order with stable pages"""
+        comments = self._thread()
+
+        response = self.client.get(f"/api/posts/{self.post.id}/comments/thread/?page_size=3")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        contents = [comment['content'] for comment in response.data['results']]
+        self.assertEqual(contents, ['root', 'a', 'a1'])
+        self.assertEqual([c['depth'] for c in response.data['results']], [0, 1, 2])
+
+        response = self.client.get(response.data['next'])
+        contents = [comment['content'] for comment in response.data['results']]
+        self.assertEqual(contents, ['b', 'second'])
+
+        response = self.client.get(
+            f"/api/posts/{self.post.id}/comments/thread/"
+            f"?root={comments['root'].id}&depth=1"
+        )
+        contents = [comment['content'] for comment in response.data['results']]
+        self.assertEqual(contents, ['root', 'a', 'b'])
+
+    def test_rebuild_comment_paths(self):
+        """Test the rebuild command restores paths from parent links"""
+        comments = self._thread()
+        expected = dict(Comment.objects.values_list('id', 'path'))
+        Comment.objects.update(path='', depth=0)
+
+        call_command('rebuild_comment_paths', stdout=StringIO())
+
+        self.assertEqual(dict(Comment.objects.values_list('id', 'path')), expected)
+        comments['a1'].refresh_from_db()
+        self.assertEqual(comments['a1'].depth, 2)
+
+    def test_replies_count_follows_lifecycle(self):
+        """Test replies_count moves on reply create, soft delete and restore"""
+        parent = Comment.objects.create(post=self.post, author=self.user, content='Parent')
+        data = {'content': 'Reply', 'parent': parent.id}
+        self.client.post(f"/api/posts/{self.post.id}/comments/", data)
+        self.client.post(f"/api/posts/{self.post.id}/comments/", data)
+        parent.refresh_from_db()
+        self.assertEqual(parent.replies_count, 2)
+
+        reply = Comment.objects.filter(parent=parent).first()
+        self.client.delete(f"/api/posts/{self.post.id}/comments/{reply.id}/")
+        parent.refresh_from_db()
+        self.assertEqual(parent.replies_count, 1)
+
+        # Saving a stale copy again must not count the delete twice
+        reply.is_deleted = True
+        reply.save()
+        parent.refresh_from_db()
+        self.assertEqual(parent.replies_count, 1)
+
+        reply.is_deleted = False
+        reply.save()
+        parent.refresh_from_db()
+        self.assertEqual(parent.replies_count, 2)
+
+    def test_comment_list_queries_are_constant(self):
+        """Test a page of comments with replies costs a fixed number of queries"""
+        def add_comments(count):
+            for i in range(count):
+                parent = Comment.objects.create(
+                    post=self.post, author=self.user, content=f'Comment {i}'
+                )
+                for j in range(7):
+                    Comment.objects.create(
+                        post=self.post, author=self.user,
+                        content=f'Reply {j}', parent=parent
+                    )
+
+        add_comments(2)
+        # Warm process-wide caches such as ContentType lookups
+        self.client.get(f"/api/posts/{self.post.id}/comments/")
+        with CaptureQueriesContext(connection) as few:
+            response = self.client.get(f"/api/posts/{self.post.id}/comments/")
+        self.assertEqual(len(response.data['results'][0]['replies']), 5)
+        self.assertEqual(response.data['results'][0]['replies_count'], 7)
+
+        add_comments(6)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(f"/api/posts/{self.post.id}/comments/")
+        self.assertEqual(len(response.data['results']), 8)
+        self.assertEqual(len(many.captured_queries), len(few.captured_queries))
+
+    def test_comments_count_follows_lifecycle(self):
+        """Test comments_count moves on create, soft delete and restore"""
+        comment = Comment.objects.create(post=self.post, author=self.user, content='One')
+        Comment.objects.create(post=self.post, author=self.user, content='Two')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+
+        comment.soft_delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+        comment.restore()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+
+    def test_reconcile_comment_counts(self):
+        """Test the reconcile command repairs drifted counters"""
+        parent = Comment.objects.create(post=self.post, author=self.user, content='Parent')
+        Comment.objects.create(post=self.post, author=self.user, content='Reply', parent=parent)
+        Post.objects.filter(pk=self.post.pk).update(comments_count=10)
+        Comment.objects.filter(pk=parent.pk).update(replies_count=0)
+
+        out = StringIO()
+        call_command('reconcile_comment_counts', stdout=out)
+
+        self.post.refresh_from_db()
+        parent.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+        self.assertEqual(parent.replies_count, 1)
+        self.assertIn('Fixed 1 post and 1 comment counters', out.getvalue())
+
+    def test_hard_delete_cascades_counters(self):
+        """Test hard-deleting a comment uncounts the replies deleted with it"""
+        parent = Comment.objects.create(post=self.post, author=self.user, content='Parent')
+        reply = Comment.objects.create(post=self.post, author=self.user, content='Reply', parent=parent)
+        Comment.objects.create(post=self.post, author=self.user, content='Nested', parent=reply)
+        Comment.objects.create(post=self.post, author=self.user, content='Hidden', parent=reply).soft_delete()
+        other = Comment.objects.create(post=self.post, author=self.user, content='Other')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 4)
+
+        parent.delete()
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(list(Comment.objects.values_list('id', flat=True)), [other.id])
+
+    def test_deleting_user_uncounts_their_comments(self):
+        """Test comments removed with their author leave others' counters right"""
+        commenter = User.objects.create_user(username='commenter', password='testpass123')
+        parent = Comment.objects.create(post=self.post, author=self.user, content='Parent')
+        Comment.objects.create(post=self.post, author=commenter, content='Reply', parent=parent)
+        Comment.objects.create(post=self.post, author=commenter, content='Top level')
+
+        commenter.delete()
+
+        self.post.refresh_from_db()
+        parent.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(parent.replies_count, 0)
+
+    def test_publish_failure_keeps_comment(self):
+        """Test a failed stream publish is logged and the comment still created"""
+        with mock.patch(
+            'apps.comments.views.publish_comment_created', side_effect=ConnectionError
+        ) as publisher:
+            publisher.__name__ = 'publish_comment_created'
+            with self.assertLogs('apps.comments.views', 'ERROR'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.post(
+                        f"/api/posts/{self.post.id}/comments/", {'content': 'Still here'}
+                    )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Comment.objects.filter(content='Still here').exists())
+
+    def test_stream_consumer_requires_groups(self):
+        """Test a stream without get_groups() is refused when routed"""
+        class GrouplessConsumer(EventStreamConsumer):
+            pass
+
+        with self.assertRaises(ImproperlyConfigured):
+            GrouplessConsumer.as_asgi()
+
+    async def test_comment_stream(self):
+        """Test new comments are pushed to viewers of the post's stream"""
+        from config.asgi import application
+
+        token = await sync_to_async(AccessToken.for_user)(self.user)
+        communicator = ApplicationCommunicator(application, {
+            'type': 'http',
+            'method': 'GET',
+            'path': f'/api/posts/{self.post.id}/comments/stream/',
+            'query_string': f'token={token}'.encode(),
+            'headers': [],
+        })
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+
+        start = await communicator.receive_output()
+        self.assertEqual(start['status'], 200)
+        self.assertEqual((await communicator.receive_output())['body'], b': connected\n\n')
+
+        def comment():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    f"/api/posts/{self.post.id}/comments/", {'content': 'Live comment'}
+                )
+
+        await sync_to_async(comment)()
+        event = (await communicator.receive_output())['body'].decode()
+        self.assertTrue(event.startswith('event: comment.created\n'))
+        self.assertIn('Live comment', event)
+        self.assertIn('"comments_count": 1', event)
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait()
+
+    async def test_comment_stream_requires_auth(self):
+        """Test the stream refuses anonymous clients"""
+        from config.asgi import application
+
+        communicator = ApplicationCommunicator(application, {
+            'type': 'http',
+            'method': 'GET',
+            'path': f'/api/posts/{self.post.id}/comments/stream/',
+            'query_string': b'',
+            'headers': [],
+        })
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        self.assertEqual((await communicator.receive_output())['status'], 401)
+        await communicator.wait()
@@ -14,6 +14,11 @@ urlpatterns = [
         }), 
         name='post_comments'
     ),
+    path(
+        'posts/<int:post_id>/comments/thread/',
+        CommentViewSet.as_view({'get': 'thread'}),
+        name='comment_thread'
+    ),
     path(
         'posts/<int:post_id>/comments/<int:pk>/', 
         CommentViewSet.as_view({
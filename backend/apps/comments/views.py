@@ -1,9 +1,13 @@
+import logging
+
 from rest_framework import  viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.contrib.contenttypes.models import ContentType
 
+from .consumers import publish_comment_created, publish_comment_deleted
 from .models import Comment
 from .serializers import (
     CommentSerializer,
@@ -13,6 +17,35 @@ from .serializers import (
 )
 from apps.posts.models import Post
 from apps.likes.models import Like
+from apps.notifications.fanout import enqueue
+from apps.notifications.models import NotificationType
+from config.pagination import KeysetPagination
+
+logger = logging.getLogger(__name__)
+
+
+def publish_after_commit(publisher, comment):
+    """
+    Push a comment event once the transaction commits. The comment is
+    already saved by then, so a stream that can't be reached is logged
+    rather than failing the request.
+    """
+    def publish():
+        try:
+            publisher(comment)
+        except Exception:
+            logger.exception("Failed to publish %s for comment %s", publisher.__name__, comment.id)
+
+    transaction.on_commit(publish)
+
+
+class ThreadPagination(KeysetPagination):
+    """Paginate a comment thread in path order"""
+    ordering = ('path',)
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
 
 class CommentViewSet(viewsets.ModelViewSet):
     """Viewset for managing comments"""
@@ -24,7 +57,7 @@ class CommentViewSet(viewsets.ModelViewSet):
             return Comment.objects.filter(
                 post_id= post_id,
                 is_deleted=False
-            ).select_related('author').prefetch_related('replies')
+            ).select_related('author')
         return Comment.objects.none()
     
     def get_serializer_class(self):
@@ -80,7 +113,22 @@ class CommentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        comment = serializer.save()
+        with transaction.atomic():
+            comment = serializer.save()
+            # Notifications point at what was commented on, so they group
+            if parent:
+                enqueue(
+                    NotificationType.COMMENT_REPLY, request.user, parent,
+                    recipient_id=parent.author_id,
+                    extra_data={'comment_id': comment.id}
+                )
+            else:
+                enqueue(
+                    NotificationType.POST_COMMENT, request.user, post,
+                    recipient_id=post.author_id,
+                    extra_data={'comment_id': comment.id}
+                )
+        publish_after_commit(publish_comment_created, comment)
 
         return Response(
             CommentSerializer(comment, context=self.get_serializer_context()).data,
@@ -119,15 +167,8 @@ class CommentViewSet(viewsets.ModelViewSet):
                 {'error': 'You can only delete your own comments'},
                 status=status.HTTP_403_FORBIDDEN
             )
-        comment.is_deleted = True
-        comment.save()
-
-        # Update post comment count
-        comment.post.comments_count = Comment.objects.filter(
-            post=comment.post,
-            is_deleted=False
-        ).count()
-        comment.post.save(update_fields=['comments_count'])
+        comment.soft_delete()
+        publish_after_commit(publish_comment_deleted, comment)
 
         return Response(
             {'message': 'Comment deleted successfully'},
@@ -142,6 +183,40 @@ class CommentViewSet(viewsets.ModelViewSet):
         serializer = CommentSerializer(replies, many=True, context=self.get_serializer_context())
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def thread(self, request, post_id=None):
+        """
+        Get a post's comments, or one comment's subtree (?root=<id>), in
+        thread order. ?depth=<n> limits how many levels are returned.
+        """
+        post = get_object_or_404(Post, id=post_id, is_deleted=False)
+        if not self._can_view_post(request.user, post):
+            return Response(
+                {'error': 'You do not have permission to view this post'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        try:
+            root_id = request.query_params.get('root')
+            max_depth = request.query_params.get('depth')
+            root_id = int(root_id) if root_id is not None else None
+            max_depth = int(max_depth) if max_depth is not None else None
+        except ValueError:
+            return Response(
+                {'error': 'root and depth must be integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        root = None
+        if root_id is not None:
+            root = get_object_or_404(Comment, id=root_id, post=post, is_deleted=False)
+
+        comments = Comment.get_thread(post.id, root=root, max_depth=max_depth)
+        paginator = ThreadPagination()
+        page = paginator.paginate_queryset(comments, request, view=self)
+        serializer = CommentSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
     def _can_view_post(self, user, post):
         """Check if user can view this post"""
          # Same logic as in posts app
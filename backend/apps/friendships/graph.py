@@ -0,0 +1,195 @@
+"""
+In-process cache of the social graph.
+
+Each user's accepted friends are kept as a sorted array of int64 IDs, so
+membership checks are a binary search and mutual-friend checks are a
+linear merge, both answered without touching the database. Entries are
+updated incrementally when a Friendship row is saved or deleted, and expire
+after FRIEND_GRAPH_CACHE_TTL seconds so other worker processes converge.
+"""
+
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+
+def _contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def _intersect(left, right):
+    """Intersection of two sorted arrays"""
+    if len(left) > len(right):
+        left, right = right, left
+
+    # Probing is cheaper than merging when one side is much smaller
+    if len(left) * 8 < len(right):
+        return [value for value in left if _contains(right, value)]
+
+    result = []
+    i = j = 0
+    while i < len(left) and j < len(right):
+        if left[i] == right[j]:
+            result.append(left[i])
+            i += 1
+            j += 1
+        elif left[i] < right[j]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+class FriendGraphCache:
+    """
+    LRU map of user ID -> sorted array of accepted friend IDs.
+
+    Arrays are copy-on-write: callers may hold on to the one they were
+    given while edges are added or removed concurrently.
+    """
+
+    def __init__(self, max_users=None, ttl=None):
+        self.max_users = max_users or getattr(settings, 'FRIEND_GRAPH_CACHE_SIZE', 100000)
+        self.ttl = ttl or getattr(settings, 'FRIEND_GRAPH_CACHE_TTL', 300)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every write so loads that raced a write are not cached
+        self._generation = 0
+
+    def _get_cached(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, friend_ids = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return friend_ids
+
+    def _store(self, user_id, friend_ids):
+        self._entries[user_id] = (time.monotonic() + self.ttl, friend_ids)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+
+    def _load(self, user_ids):
+        """Fetch adjacency for user_ids from the database in one query"""
+        from .models import Friendship
+
+        adjacency = {user_id: [] for user_id in user_ids}
+        edges = Friendship.objects.filter(
+            Q(requester_id__in=user_ids) | Q(addressee_id__in=user_ids),
+            status='accepted'
+        ).values_list('requester_id', 'addressee_id')
+
+        for requester_id, addressee_id in edges:
+            if requester_id in adjacency:
+                adjacency[requester_id].append(addressee_id)
+            if addressee_id in adjacency:
+                adjacency[addressee_id].append(requester_id)
+
+        return {
+            user_id: array('q', sorted(set(friend_ids)))
+            for user_id, friend_ids in adjacency.items()
+        }
+
+    def prime(self, user_ids):
+        """Make sure every user in user_ids is cached, loading misses at once"""
+        with self._lock:
+            missing = {
+                user_id for user_id in user_ids
+                if self._get_cached(user_id) is None
+            }
+            generation = self._generation
+        if not missing:
+            return
+
+        loaded = self._load(missing)
+        with self._lock:
+            if generation == self._generation:
+                for user_id, friend_ids in loaded.items():
+                    self._store(user_id, friend_ids)
+
+    def friends(self, user_id):
+        """Sorted array of user_id's accepted friend IDs"""
+        with self._lock:
+            friend_ids = self._get_cached(user_id)
+            generation = self._generation
+        if friend_ids is not None:
+            return friend_ids
+
+        friend_ids = self._load([user_id])[user_id]
+        with self._lock:
+            if generation == self._generation:
+                self._store(user_id, friend_ids)
+        return friend_ids
+
+    def degree(self, user_id):
+        return len(self.friends(user_id))
+
+    def are_friends(self, user1_id, user2_id):
+        return _contains(self.friends(user1_id), user2_id)
+
+    def mutual_friends(self, user1_id, user2_id):
+        return _intersect(self.friends(user1_id), self.friends(user2_id))
+
+    def mutual_friend_counts(self, user_id, other_ids):
+        """Mutual friend count between user_id and each of other_ids"""
+        self.prime([user_id, *other_ids])
+        friend_ids = self.friends(user_id)
+        return {
+            other_id: len(_intersect(friend_ids, self.friends(other_id)))
+            for other_id in other_ids
+        }
+
+    def add_edge(self, user1_id, user2_id):
+        """Record an accepted friendship in both cached adjacency lists"""
+        with self._lock:
+            self._generation += 1
+            for user_id, friend_id in ((user1_id, user2_id), (user2_id, user1_id)):
+                friend_ids = self._get_cached(user_id)
+                if friend_ids is not None and not _contains(friend_ids, friend_id):
+                    updated = array('q', friend_ids)
+                    insort(updated, friend_id)
+                    self._store(user_id, updated)
+
+    def remove_edge(self, user1_id, user2_id):
+        """Drop a friendship from both cached adjacency lists"""
+        with self._lock:
+            self._generation += 1
+            for user_id, friend_id in ((user1_id, user2_id), (user2_id, user1_id)):
+                friend_ids = self._get_cached(user_id)
+                if friend_ids is not None and _contains(friend_ids, friend_id):
+                    updated = array('q', friend_ids)
+                    updated.pop(bisect_left(updated, friend_id))
+                    self._store(user_id, updated)
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+friend_graph = FriendGraphCache()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def forget_new_user(sender, instance, created, **kwargs):
+    """Never serve adjacency cached for a previous owner of a reused ID"""
+    if created:
+        friend_graph.invalidate(instance.id)
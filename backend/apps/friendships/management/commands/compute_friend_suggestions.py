@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from apps.friendships.suggestions import compute_suggestions, refresh_stale_suggestions
+
+
+class Command(BaseCommand):
+    help = "Precompute scored friend suggestions for every user, or only stale ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale',
+            action='store_true',
+            help='Only refresh users whose friendships changed since the last run'
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Only recompute this user ID (can be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        if options['stale']:
+            total = refresh_stale_suggestions()
+        else:
+            total = compute_suggestions(options['user_ids'])
+
+        self.stdout.write(self.style.SUCCESS(f"Computed suggestions for {total} users"))
@@ -1,7 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 
+from .graph import friend_graph
+
 User = get_user_model()
 
 class Friendship(models.Model):
@@ -55,13 +57,26 @@ class Friendship(models.Model):
         self.clean()
         super().save(*args, **kwargs)
 
+        # Keep the in-process social graph in step with this row, once the
+        # row is committed so a rolled-back write never reaches the cache
+        requester_id, addressee_id = self.requester_id, self.addressee_id
+        if self.status == 'accepted':
+            transaction.on_commit(lambda: friend_graph.add_edge(requester_id, addressee_id))
+        else:
+            transaction.on_commit(lambda: friend_graph.remove_edge(requester_id, addressee_id))
+        FriendSuggestion.mark_stale(self.requester_id, self.addressee_id)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        requester_id, addressee_id = self.requester_id, self.addressee_id
+        transaction.on_commit(lambda: friend_graph.remove_edge(requester_id, addressee_id))
+        FriendSuggestion.mark_stale(self.requester_id, self.addressee_id)
+        return result
+
     @classmethod
     def are_friends(cls, user1, user2):
         """Checks if two users are friends"""
-        return cls.objects.filter(
-            models.Q(requester=user1, addressee=user2, status='accepted') | 
-            models.Q(requester=user2, addressee=user1, status='accepted')
-        ).exists()
+        return friend_graph.are_friends(user1.id, user2.id)
     
     @classmethod
     def get_friendship(cls, user1, user2):
@@ -77,50 +92,77 @@ class Friendship(models.Model):
     @classmethod
     def get_friends(cls, user):
         """Get all friends of a user"""
-        friend_relationships = cls.objects.filter(
-            models.Q(requester=user, status='accepted') |
-            models.Q(addressee=user, status='accepted')
-        )
-        friend_ids = set()
-        for friendship in friend_relationships:
-            if friendship.requester == user:
-                friend_ids.add(friendship.addressee.id)
-            else:
-                friend_ids.add(friendship.requester.id)
-
-        return User.objects.filter(id__in=friend_ids)
+        return User.objects.filter(id__in=list(friend_graph.friends(user.id)))
     
 
     @classmethod
     def get_mutual_friends(cls, user1, user2):
         """Get mutual friends between two users"""
-        user1_friends = set(cls.get_friends(user1).values_list('id', flat=True))
-        user2_friends = set(cls.get_friends(user2).values_list('id', flat=True))
-
-        mutual_friend_ids = user1_friends.intersection(user2_friends)
+        mutual_friend_ids = friend_graph.mutual_friends(user1.id, user2.id)
         return User.objects.filter(id__in=mutual_friend_ids)
 
     @classmethod
     def get_friend_suggestions(cls, user, limit=10):
-        """Get friend suggestions based on mutual friends"""
-        # Get user's current friends
-        current_friends = cls.get_friends(user)
-        current_friends_ids = set(current_friends.values_list('id', flat=True))
-
-        # Get friends of friends
-        friends_of_friends = User.objects.filter(
-            models.Q(sent_friend_requests__addressee__in=current_friends,
-                     sent_friend_requests__status='accepted') | 
-            models.Q(received_friend_requests__requester__in=current_friends,
-                    received_friend_requests__status='accepted')
-        ).exclude(
-            id=user.id # Exclude self
-        ).exclude(
-            id__in=current_friends_ids # Exclude existing friends
-        ).exclude(
-            # Exclude users with existing friend requests
-            models.Q(sent_friend_requests__addressee=user) |
-            models.Q(received_friend_requests__requester=user)
-        ).distinct()[:limit]
-        
-        return friends_of_friends
+        """Get precomputed friend suggestions, best first"""
+        suggestions = FriendSuggestion.objects.filter(
+            user=user
+        ).select_related('suggested_user')[:limit]
+        return [suggestion.suggested_user for suggestion in suggestions]
+
+
+class FriendSuggestion(models.Model):
+    """Precomputed suggestion, written by the compute_friend_suggestions command"""
+
+    user = models.ForeignKey(
+        User,
+        related_name='friend_suggestions',
+        on_delete=models.CASCADE
+    )
+    suggested_user = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+    score = models.FloatField()
+    mutual_friends_count = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-score']
+        unique_together = ('user', 'suggested_user')
+        indexes = [
+            models.Index(fields=['user', '-score']),
+        ]
+
+    def __str__(self):
+        return f"{self.suggested_user_id} for {self.user_id} ({self.score:.2f})"
+
+    @classmethod
+    def mark_stale(cls, user1_id, user2_id):
+        """Drop the pair's suggestions and queue both users for a refresh"""
+        cls.objects.filter(
+            models.Q(user_id=user1_id, suggested_user_id=user2_id) |
+            models.Q(user_id=user2_id, suggested_user_id=user1_id)
+        ).delete()
+        # Re-queueing bumps requested_at, so a refresh already running for
+        # these users won't clear the request
+        SuggestionRefresh.objects.bulk_create(
+            [SuggestionRefresh(user_id=user1_id), SuggestionRefresh(user_id=user2_id)],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['requested_at']
+        )
+
+
+class SuggestionRefresh(models.Model):
+    """A user whose edges changed since their suggestions were computed"""
+
+    user = models.OneToOneField(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+    requested_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Refresh suggestions for {self.user_id}"
@@ -1,7 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db.models import Q
+from .graph import friend_graph
 from .models import Friendship
 from apps.users.serializers import UserListSerializer
+from apps.likes.serializers import ViewerStateListSerializer
 
 User = get_user_model()
 
@@ -76,12 +79,38 @@ class FriendListSerializer(serializers.ModelSerializer):
             'location', 'is_verified', 'mutual_friends_count',
             'friendship_date'
         ]
+        list_serializer_class = ViewerStateListSerializer
 
-    def get_mutual_friends_count(self, obj):
+    def preload(self, instances):
+        """Compute mutual counts and friendship dates for the whole page"""
         request_user = self.context['request'].user
-        return len(Friendship.get_mutual_friends(request_user, obj))
+        user_ids = [user.id for user in instances]
+
+        self.context['mutual_friends_counts'] = friend_graph.mutual_friend_counts(
+            request_user.id, user_ids
+        )
+
+        friendship_dates = {}
+        for requester_id, addressee_id, updated_at in Friendship.objects.filter(
+            Q(requester=request_user, addressee_id__in=user_ids) |
+            Q(addressee=request_user, requester_id__in=user_ids),
+            status='accepted'
+        ).values_list('requester_id', 'addressee_id', 'updated_at'):
+            other_id = addressee_id if requester_id == request_user.id else requester_id
+            friendship_dates[other_id] = updated_at
+        self.context['friendship_dates'] = friendship_dates
+
+    def get_mutual_friends_count(self, obj):
+        counts = self.context.get('mutual_friends_counts')
+        if counts is None or obj.id not in counts:
+            request_user = self.context['request'].user
+            return len(friend_graph.mutual_friends(request_user.id, obj.id))
+        return counts[obj.id]
     
     def get_friendship_date(self, obj):
+        dates = self.context.get('friendship_dates')
+        if dates is not None:
+            return dates.get(obj.id)
         request_user = self.context['request'].user
         friendship = Friendship.get_friendship(request_user, obj)
         if friendship and friendship.status == 'accepted':
@@ -0,0 +1,205 @@
+"""
+Offline friend suggestion engine.
+
+Builds the accepted-friendship adjacency in a single pass over the edge
+table, then scores every friend-of-friend candidate for each target user
+on mutual friend count, shared location/work/education and how recently
+the connecting friendships were made. The best candidates are written to
+FriendSuggestion, so serving suggestions is one indexed read.
+"""
+
+import heapq
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Friendship, FriendSuggestion, SuggestionRefresh
+
+User = get_user_model()
+
+MUTUAL_WEIGHT = 1.0
+PROFILE_WEIGHT = 0.5  # per shared location / work / education
+RECENCY_WEIGHT = 1.0
+RECENCY_HALF_LIFE_DAYS = 30
+
+CHUNK_SIZE = 500
+
+
+def suggestions_per_user():
+    return getattr(settings, 'FRIEND_SUGGESTIONS_PER_USER', 50)
+
+
+def _chunks(values, size=CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def load_graph(user_ids=None):
+    """
+    Accepted adjacency sets and edge timestamps.
+    Loads the whole graph when user_ids is None, else only their edges.
+    """
+    adjacency = defaultdict(set)
+    edge_times = {}
+
+    if user_ids is None:
+        batches = [Friendship.objects.filter(status='accepted')]
+    else:
+        batches = (
+            Friendship.objects.filter(
+                Q(requester_id__in=chunk) | Q(addressee_id__in=chunk),
+                status='accepted'
+            )
+            for chunk in _chunks(user_ids)
+        )
+
+    for edges in batches:
+        for requester_id, addressee_id, updated_at in edges.values_list(
+            'requester_id', 'addressee_id', 'updated_at'
+        ).iterator():
+            adjacency[requester_id].add(addressee_id)
+            adjacency[addressee_id].add(requester_id)
+            edge_times[requester_id, addressee_id] = updated_at
+            edge_times[addressee_id, requester_id] = updated_at
+
+    return adjacency, edge_times
+
+
+def load_exclusions(user_ids):
+    """Users each target already has a pending, declined or blocked row with"""
+    excluded = defaultdict(set)
+    for chunk in _chunks(user_ids):
+        for requester_id, addressee_id in Friendship.objects.filter(
+            Q(requester_id__in=chunk) | Q(addressee_id__in=chunk)
+        ).exclude(status='accepted').values_list('requester_id', 'addressee_id'):
+            excluded[requester_id].add(addressee_id)
+            excluded[addressee_id].add(requester_id)
+    return excluded
+
+
+def load_profiles(user_ids):
+    """Normalized (location, work, education) per user"""
+    profiles = {}
+    for chunk in _chunks(user_ids):
+        for user_id, *fields in User.objects.filter(id__in=chunk).values_list(
+            'id', 'location', 'work', 'education'
+        ):
+            profiles[user_id] = tuple(value.strip().lower() for value in fields)
+    return profiles
+
+
+def score_candidates(user_id, adjacency, edge_times, excluded, profiles, now):
+    """Score every friend-of-friend of user_id, best first"""
+    friends = adjacency.get(user_id, set())
+    mutual = Counter()
+    newest = {}
+    for friend_id in friends:
+        for candidate_id in adjacency.get(friend_id, ()):
+            mutual[candidate_id] += 1
+            made_at = edge_times[friend_id, candidate_id]
+            if candidate_id not in newest or made_at > newest[candidate_id]:
+                newest[candidate_id] = made_at
+
+    skip = {user_id} | friends | excluded.get(user_id, set())
+    profile = profiles.get(user_id, ('', '', ''))
+
+    scored = []
+    for candidate_id, mutual_count in mutual.items():
+        if candidate_id in skip:
+            continue
+        shared = sum(
+            1 for mine, theirs in zip(profile, profiles.get(candidate_id, ('', '', '')))
+            if mine and mine == theirs
+        )
+        age_days = max((now - newest[candidate_id]).total_seconds(), 0) / 86400
+        recency = 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+        score = (
+            MUTUAL_WEIGHT * mutual_count
+            + PROFILE_WEIGHT * shared
+            + RECENCY_WEIGHT * recency
+        )
+        scored.append((score, mutual_count, candidate_id))
+
+    return heapq.nlargest(suggestions_per_user(), scored)
+
+
+def _write(user_ids, adjacency, edge_times, now):
+    """Replace stored suggestions for user_ids"""
+    excluded = load_exclusions(user_ids)
+    candidate_ids = {
+        candidate_id
+        for user_id in user_ids
+        for friend_id in adjacency.get(user_id, ())
+        for candidate_id in adjacency.get(friend_id, ())
+    }
+    profiles = load_profiles(set(user_ids) | candidate_ids)
+
+    rows = [
+        FriendSuggestion(
+            user_id=user_id,
+            suggested_user_id=candidate_id,
+            score=score,
+            mutual_friends_count=mutual_count,
+            computed_at=now,
+        )
+        for user_id in user_ids
+        for score, mutual_count, candidate_id in score_candidates(
+            user_id, adjacency, edge_times, excluded, profiles, now
+        )
+    ]
+
+    with transaction.atomic():
+        FriendSuggestion.objects.filter(user_id__in=user_ids).delete()
+        FriendSuggestion.objects.bulk_create(rows, batch_size=1000)
+        SuggestionRefresh.objects.filter(
+            user_id__in=user_ids,
+            requested_at__lte=now
+        ).delete()
+
+
+def compute_suggestions(user_ids=None):
+    """
+    Recompute suggestions for user_ids, or for every active user.
+    Returns the number of users processed.
+    """
+    now = timezone.now()
+
+    if user_ids is None:
+        adjacency, edge_times = load_graph()
+        user_ids = User.objects.filter(is_active=True).values_list('id', flat=True)
+    else:
+        user_ids = list(user_ids)
+        # Targets' edges, then their friends' edges to reach the second hop
+        adjacency, edge_times = load_graph(user_ids)
+        friend_ids = set().union(*(adjacency[user_id] for user_id in user_ids))
+        second_hop, second_hop_times = load_graph(friend_ids - set(user_ids))
+        for user_id, neighbours in second_hop.items():
+            adjacency[user_id] |= neighbours
+        edge_times.update(second_hop_times)
+
+    total = 0
+    for chunk in _chunks(user_ids):
+        _write(chunk, adjacency, edge_times, now)
+        total += len(chunk)
+    return total
+
+
+def refresh_stale_suggestions():
+    """
+    Recompute suggestions for users whose edges changed, plus their friends
+    (a changed edge moves users in and out of their friends' second hop)
+    """
+    stale_ids = list(SuggestionRefresh.objects.values_list('user_id', flat=True))
+    if not stale_ids:
+        return 0
+
+    adjacency, _ = load_graph(stale_ids)
+    affected = set(stale_ids)
+    for user_id in stale_ids:
+        affected |= adjacency.get(user_id, set())
+    return compute_suggestions(affected)
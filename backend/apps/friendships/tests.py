@@ -1,9 +1,13 @@
+from django.db import transaction
 from django.test import TestCase
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from io import StringIO
 
-from .models import Friendship
+from .graph import friend_graph
+from .models import Friendship, FriendSuggestion, SuggestionRefresh
 
 User = get_user_model()
 
@@ -133,4 +137,144 @@ class FriendshipTestCase(TestCase):
         self.assertIsInstance(response.data, list)
         self.assertEqual(len(response.data), 1)
         mutual_friend_data = response.data[0]
-        self.assertEqual(mutual_friend_data['username'], mutual_friend.username)
\ No newline at end of file
+        self.assertEqual(mutual_friend_data['username'], mutual_friend.username)
+
+    def test_graph_cache_answers_from_memory(self):
+        """Test friendship checks are served from the graph cache"""
+        friend = User.objects.create_user(username='friend', password='testpassword')
+        Friendship.objects.create(
+            requester=self.user,
+            addressee=self.target_user,
+            status='accepted'
+        )
+        Friendship.objects.create(
+            requester=friend,
+            addressee=self.target_user,
+            status='accepted'
+        )
+        friend_graph.prime([self.user.id, friend.id, self.target_user.id])
+
+        with self.assertNumQueries(0):
+            self.assertTrue(Friendship.are_friends(self.user, self.target_user))
+            self.assertFalse(Friendship.are_friends(self.user, friend))
+            self.assertEqual(
+                friend_graph.mutual_friends(self.user.id, friend.id),
+                [self.target_user.id]
+            )
+
+    def test_graph_cache_follows_unfriend_and_block(self):
+        """Test the graph cache is updated when friendships change"""
+        Friendship.objects.create(
+            requester=self.user,
+            addressee=self.target_user,
+            status='accepted'
+        )
+        self.assertTrue(Friendship.are_friends(self.user, self.target_user))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/friends/{self.target_user.id}/unfriend/')
+        self.assertFalse(Friendship.are_friends(self.user, self.target_user))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Friendship.objects.create(
+                requester=self.target_user,
+                addressee=self.user,
+                status='accepted'
+            )
+        self.assertTrue(Friendship.are_friends(self.target_user, self.user))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/friends/{self.target_user.id}/block/')
+        self.assertFalse(Friendship.are_friends(self.target_user, self.user))
+
+    def test_graph_cache_ignores_rolled_back_writes(self):
+        """Test an accept that rolls back never reaches the graph cache"""
+        friendship = Friendship.objects.create(
+            requester=self.user,
+            addressee=self.target_user
+        )
+        self.assertFalse(Friendship.are_friends(self.user, self.target_user))
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                friendship.status = 'accepted'
+                friendship.save()
+                raise RuntimeError
+        self.assertFalse(Friendship.are_friends(self.user, self.target_user))
+
+    def test_friends_list_mutual_counts_are_batched(self):
+        """Test mutual counts and dates for the friends list use constant queries"""
+        friends = [
+            User.objects.create_user(username=f'friend{i}', password='testpassword')
+            for i in range(4)
+        ]
+        for friend in friends:
+            Friendship.objects.create(
+                requester=self.user,
+                addressee=friend,
+                status='accepted'
+            )
+        # friend0 and friend1 know each other, so each has one mutual friend
+        Friendship.objects.create(
+            requester=friends[0],
+            addressee=friends[1],
+            status='accepted'
+        )
+        friend_graph.clear()
+
+        # user adjacency, friend users, friends' adjacency, friendship dates
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/friends/friends/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        counts = {row['username']: row['mutual_friends_count'] for row in response.data}
+        self.assertEqual(counts, {'friend0': 1, 'friend1': 1, 'friend2': 0, 'friend3': 0})
+        self.assertTrue(all(row['friendship_date'] for row in response.data))
+
+    def test_precomputed_suggestions(self):
+        """Test suggestions are served from the precomputed table"""
+        close = User.objects.create_user(username='close', password='testpassword', work='Acme')
+        distant = User.objects.create_user(username='distant', password='testpassword')
+        other_friend = User.objects.create_user(username='other', password='testpassword')
+        self.user.work = 'Acme'
+        self.user.save()
+
+        for friend in (self.target_user, other_friend):
+            Friendship.objects.create(requester=self.user, addressee=friend, status='accepted')
+        # close shares two friends and a workplace, distant shares one friend
+        Friendship.objects.create(requester=self.target_user, addressee=close, status='accepted')
+        Friendship.objects.create(requester=other_friend, addressee=close, status='accepted')
+        Friendship.objects.create(requester=self.target_user, addressee=distant, status='accepted')
+
+        call_command('compute_friend_suggestions', stdout=StringIO())
+
+        response = self.client.get('/api/friends/suggestions/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [user['username'] for user in response.data],
+            ['close', 'distant']
+        )
+        suggestion = FriendSuggestion.objects.get(user=self.user, suggested_user=close)
+        self.assertEqual(suggestion.mutual_friends_count, 2)
+
+    def test_stale_suggestions_refresh(self):
+        """Test only users whose edges changed are recomputed"""
+        candidate = User.objects.create_user(username='candidate', password='testpassword')
+        call_command('compute_friend_suggestions', stdout=StringIO())
+        self.assertFalse(FriendSuggestion.objects.exists())
+
+        Friendship.objects.create(requester=self.user, addressee=self.target_user, status='accepted')
+        Friendship.objects.create(requester=self.target_user, addressee=candidate, status='accepted')
+        self.assertTrue(SuggestionRefresh.objects.filter(user=candidate).exists())
+
+        call_command('compute_friend_suggestions', '--stale', stdout=StringIO())
+
+        self.assertFalse(SuggestionRefresh.objects.exists())
+        self.assertTrue(
+            FriendSuggestion.objects.filter(user=self.user, suggested_user=candidate).exists()
+        )
+
+        # Sending a request removes the pair from suggestions straight away
+        self.client.post('/api/friends/send_request/', {'user_id': candidate.id})
+        response = self.client.get('/api/friends/suggestions/')
+        self.assertEqual(response.data, [])
@@ -2,6 +2,7 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 
 from .models import Friendship
@@ -13,6 +14,9 @@ from .serializers import (
 )
 
 from apps.users.serializers import UserListSerializer
+from apps.notifications.fanout import enqueue
+from apps.notifications.models import NotificationType
+from apps.posts.timeline import link_friends, unlink_friends
 
 User = get_user_model()
 
@@ -31,14 +35,17 @@ class FriendshipViewSet(viewsets.GenericViewSet):
         serializer.is_valid(raise_exception=True)
         target_user = serializer.validated_data['target_user']
 
-        # Create friend request
-        friendship = Friendship.objects.create(
-            requester=request.user,
-            addressee=target_user,
-            status='pending'
-        )
-
-        # TODO: Send notification to target user
+        # Create friend request and queue the notification with it
+        with transaction.atomic():
+            friendship = Friendship.objects.create(
+                requester=request.user,
+                addressee=target_user,
+                status='pending'
+            )
+            enqueue(
+                NotificationType.FRIEND_REQUEST, request.user, friendship,
+                recipient_id=target_user.id
+            )
 
         return Response({
             'message': f"Friend request sent to {target_user.username}",
@@ -62,16 +69,20 @@ class FriendshipViewSet(viewsets.GenericViewSet):
         action = serializer.validated_data['action']
         
         if action == 'accept':
-            friendship.status = 'accepted'
-            friendship.save()
+            with transaction.atomic():
+                friendship.status = 'accepted'
+                friendship.save()
+                enqueue(
+                    NotificationType.FRIEND_ACCEPT, request.user, friendship,
+                    recipient_id=friendship.requester_id
+                )
+            link_friends(friendship.requester, friendship.addressee)
             message = f'Friend request from {friendship.requester.username} accepted'
         else:  # decline
             friendship.status = 'declined'
             friendship.save()
             message = f'Friend request from {friendship.requester.username} declined'
         
-        # TODO: Send notification to requester
-        
         return Response({
             'message': message,
             'friendship': FriendshipSerializer(friendship).data
@@ -124,6 +135,7 @@ class FriendshipViewSet(viewsets.GenericViewSet):
             )
         
         friendship.delete()
+        unlink_friends(request.user, friend)
         
         return Response({
             'message': f'You are no longer friends with {friend.username}'
@@ -147,6 +159,7 @@ class FriendshipViewSet(viewsets.GenericViewSet):
             friendship.requester = request.user  # Blocker becomes requester
             friendship.addressee = user_to_block
             friendship.save()
+            unlink_friends(request.user, user_to_block)
         else:
             friendship = Friendship.objects.create(
                 requester=request.user,
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class LikesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.likes'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from .registry import like_targets
+
+        # New models get their ContentType rows during migrate
+        post_migrate.connect(
+            lambda **kwargs: like_targets.clear(),
+            weak=False,
+            dispatch_uid='likes.clear_like_targets'
+        )
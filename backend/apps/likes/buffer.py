@@ -0,0 +1,168 @@
+"""
+Write-behind buffer for reaction counters.
+
+With LIKE_COUNTER_BUFFER_ENABLED, toggle_like records counter deltas
+here instead of locking the liked object's row. A background thread
+folds the deltas per object and applies them every
+LIKE_COUNTER_FLUSH_INTERVAL_MS, so a viral post takes one row update per
+flush rather than one per reaction. Reads add pending deltas on top of
+the persisted values.
+
+Counters are approximate while buffering is on. Deltas live in the
+memory of the process that took the reaction, so other processes show
+counts up to a flush interval old, and a process killed before it
+flushes (SIGKILL, OOM) loses its pending deltas for good; the atexit
+flush only covers clean shutdowns. The Like rows themselves are always
+written, so manage.py reconcile_like_counts recounts the counters from
+them.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+def buffering_enabled():
+    return getattr(settings, 'LIKE_COUNTER_BUFFER_ENABLED', False)
+
+
+def flush_interval():
+    """Seconds between flushes; 0 disables the background flusher"""
+    return getattr(settings, 'LIKE_COUNTER_FLUSH_INTERVAL_MS', 500) / 1000
+
+
+def apply_deltas(likes_count, reaction_counts, deltas):
+    """Add {reaction: delta} to a likes_count / reaction_counts pair"""
+    counts = dict(reaction_counts or {})
+    for reaction, delta in deltas.items():
+        counts[reaction] = counts.get(reaction, 0) + delta
+        if counts[reaction] <= 0:
+            del counts[reaction]
+    return max(likes_count + sum(deltas.values()), 0), counts
+
+
+class CounterBuffer:
+    """Pending reaction deltas: (model label, object ID) -> {reaction: delta}"""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def add(self, model, object_id, removed=None, added=None):
+        key = (model._meta.label_lower, object_id)
+        with self._lock:
+            deltas = self._pending.setdefault(key, {})
+            if removed:
+                deltas[removed] = deltas.get(removed, 0) - 1
+            if added:
+                deltas[added] = deltas.get(added, 0) + 1
+        self._start_flusher()
+
+    def pending(self, model, object_id):
+        """Pending (likes_count delta, {reaction: delta}) for one object"""
+        with self._lock:
+            deltas = {
+                reaction: delta
+                for reaction, delta in self._pending.get(
+                    (model._meta.label_lower, object_id), {}
+                ).items()
+                if delta
+            }
+        return sum(deltas.values()), deltas
+
+    def merge(self, model, object_id, likes_count, reaction_counts):
+        """Persisted counters plus whatever is still waiting to be flushed"""
+        _, deltas = self.pending(model, object_id)
+        if not deltas:
+            return likes_count, reaction_counts
+        return apply_deltas(likes_count, reaction_counts, deltas)
+
+    def _drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def _restore(self, pending):
+        with self._lock:
+            for key, deltas in pending.items():
+                current = self._pending.setdefault(key, {})
+                for reaction, delta in deltas.items():
+                    current[reaction] = current.get(reaction, 0) + delta
+
+    def flush(self):
+        """Apply every pending delta, one locked batch UPDATE per model"""
+        pending = self._drain()
+        by_model = defaultdict(dict)
+        for (label, object_id), deltas in pending.items():
+            deltas = {reaction: delta for reaction, delta in deltas.items() if delta}
+            if deltas:
+                by_model[label][object_id] = deltas
+        if not by_model:
+            return 0
+
+        try:
+            with transaction.atomic():
+                for label, deltas_by_object in by_model.items():
+                    self._apply(label, deltas_by_object)
+        except Exception:
+            # Keep the deltas for the next flush rather than losing them
+            self._restore(pending)
+            raise
+        return sum(len(deltas_by_object) for deltas_by_object in by_model.values())
+
+    def _apply(self, label, deltas_by_object):
+        model = apps.get_model(label)
+        rows = model.objects.select_for_update().only(
+            'likes_count', 'reaction_counts'
+        ).in_bulk(list(deltas_by_object))
+
+        for object_id, row in rows.items():
+            row.likes_count, row.reaction_counts = apply_deltas(
+                row.likes_count, row.reaction_counts, deltas_by_object[object_id]
+            )
+
+        model.objects.bulk_update(
+            rows.values(), ['likes_count', 'reaction_counts'], batch_size=500
+        )
+
+    def _start_flusher(self):
+        interval = flush_interval()
+        if not interval or self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._run, args=(interval,),
+                    name='like-counter-flusher', daemon=True
+                )
+                self._flusher.start()
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush like counters")
+            finally:
+                close_old_connections()
+
+
+counter_buffer = CounterBuffer()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        counter_buffer.flush()
+    except Exception:
+        logger.exception("Failed to flush like counters on exit")
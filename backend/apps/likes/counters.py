@@ -0,0 +1,38 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+
+def has_counters(model):
+    """Whether a likeable model keeps denormalized reaction counters"""
+    field_names = {field.name for field in model._meta.get_fields()}
+    return {'likes_count', 'reaction_counts'} <= field_names
+
+
+def apply_reaction_change(model, object_id, removed=None, added=None):
+    """
+    Move one reaction on an object from `removed` to `added` (either may be
+    None) and return the new (likes_count, reaction_counts).
+
+    Must run inside the transaction that writes the Like row. The object's
+    row is locked first, so concurrent toggles on the same object queue up
+    instead of overwriting each other's breakdown.
+    """
+    row = model.objects.select_for_update().only(
+        'likes_count', 'reaction_counts'
+    ).get(pk=object_id)
+
+    counts = dict(row.reaction_counts or {})
+    if removed:
+        counts[removed] = counts.get(removed, 0) - 1
+        if counts[removed] <= 0:
+            del counts[removed]
+    if added:
+        counts[added] = counts.get(added, 0) + 1
+
+    delta = (1 if added else 0) - (1 if removed else 0)
+    updates = {'reaction_counts': counts}
+    if delta:
+        updates['likes_count'] = Greatest(F('likes_count') + delta, 0)
+    model.objects.filter(pk=object_id).update(**updates)
+
+    return max(row.likes_count + delta, 0), counts
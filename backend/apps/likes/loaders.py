@@ -0,0 +1,56 @@
+from django.contrib.contenttypes.models import ContentType
+
+from .models import Like
+
+
+class ViewerReactionLoader:
+    """
+    Resolves the requesting user's reactions for a page of objects.
+
+    Results are cached in the serializer context, per model and object ID,
+    so posts, comments and nested replies serialized in the same response
+    share one cache and each page costs a single Like query per model.
+    """
+
+    context_key = 'viewer_reactions'
+
+    def __init__(self, context):
+        request = context.get('request')
+        self.user = getattr(request, 'user', None)
+        self.cache = context.setdefault(self.context_key, {})
+
+    @property
+    def enabled(self):
+        return self.user is not None and self.user.is_authenticated
+
+    def prime(self, objects):
+        """Load reactions for every object that hasn't been resolved yet"""
+        if not self.enabled:
+            return
+
+        missing = {}
+        for obj in objects:
+            model = obj._meta.concrete_model
+            if obj.pk not in self.cache.get(model, {}):
+                missing.setdefault(model, set()).add(obj.pk)
+
+        for model, object_ids in missing.items():
+            reactions = dict(Like.objects.filter(
+                user=self.user,
+                content_type=ContentType.objects.get_for_model(model),
+                object_id__in=object_ids
+            ).values_list('object_id', 'reaction_type'))
+
+            resolved = self.cache.setdefault(model, {})
+            for object_id in object_ids:
+                resolved[object_id] = reactions.get(object_id)
+
+    def get(self, obj):
+        """The viewer's reaction type for obj, or None"""
+        if not self.enabled:
+            return None
+
+        model = obj._meta.concrete_model
+        if obj.pk not in self.cache.get(model, {}):
+            self.prime([obj])
+        return self.cache[model][obj.pk]
@@ -34,7 +34,10 @@ class Like(models.Model):
     class Meta:
         unique_together = ('user', 'content_type', 'object_id')
         indexes = [
-            models.Index(fields=['content_type', 'object_id']),
+            models.Index(fields=['content_type', 'object_id', '-created_at', '-id']),
+            models.Index(fields=[
+                'content_type', 'object_id', 'reaction_type', '-created_at', '-id'
+            ]),
             models.Index(fields=['user']),
             models.Index(fields=['reaction_type']),
         ]
@@ -0,0 +1,68 @@
+"""
+Registry of content types the likes endpoints accept.
+
+Maps the `content_type` URL slug (the model name, e.g. 'post') to its
+ContentType ID and model class, loaded from one query the first time it is
+needed and kept for the life of the process. Only models listed in
+LIKEABLE_MODELS can be reacted to.
+"""
+
+import threading
+from collections import namedtuple
+
+from django.contrib.contenttypes.models import ContentType
+
+LIKEABLE_MODELS = ('posts.post', 'comments.comment')
+
+LikeTarget = namedtuple('LikeTarget', ['content_type_id', 'model', 'likeable'])
+
+
+class LikeTargetRegistry:
+    """URL slug -> LikeTarget"""
+
+    def __init__(self):
+        self._targets = None
+        self._lock = threading.Lock()
+
+    def warm(self):
+        targets = {}
+        for ct in ContentType.objects.all():
+            model = ct.model_class()
+            if model is None:
+                # Stale row for a model that no longer exists
+                continue
+            likeable = model._meta.label_lower in LIKEABLE_MODELS
+            # Model names can repeat across apps; a likeable model wins the slug
+            if ct.model not in targets or likeable:
+                targets[ct.model] = LikeTarget(ct.id, model, likeable)
+
+        with self._lock:
+            self._targets = targets
+        return targets
+
+    def clear(self):
+        with self._lock:
+            self._targets = None
+
+    def resolve(self, slug):
+        """The LikeTarget for slug, or None if no such model"""
+        targets = self._targets
+        if targets is None:
+            targets = self.warm()
+        return targets.get(slug)
+
+
+like_targets = LikeTargetRegistry()
+
+
+def target_state(target, object_id):
+    """
+    'missing', 'deleted' or 'ok' for one object, read without loading it
+    """
+    queryset = target.model.objects.filter(pk=object_id)
+    if any(field.name == 'is_deleted' for field in target.model._meta.get_fields()):
+        is_deleted = queryset.values_list('is_deleted', flat=True).first()
+        if is_deleted is None:
+            return 'missing'
+        return 'deleted' if is_deleted else 'ok'
+    return 'ok' if queryset.exists() else 'missing'
@@ -1,4 +1,7 @@
+from django.db import models
 from rest_framework import serializers
+from .buffer import buffering_enabled, counter_buffer
+from .loaders import ViewerReactionLoader
 from .models import Like
 from apps.users.serializers import UserListSerializer
 
@@ -16,4 +19,56 @@ class ReactionSerializer(serializers.Serializer):
     reaction_type = serializers.ChoiceField(
         choices=Like.REACTION_TYPES,
         default='like'
-    )
\ No newline at end of file
+    )
+
+class ReactionTargetSerializer(serializers.Serializer):
+    """One (content_type, object_id) pair"""
+    content_type = serializers.CharField(max_length=100)
+    object_id = serializers.IntegerField(min_value=1)
+
+class BatchReactionCheckSerializer(serializers.Serializer):
+    """Serializer for checking reactions on many objects at once"""
+    MAX_TARGETS = 300
+
+    targets = ReactionTargetSerializer(
+        many=True,
+        allow_empty=False,
+        max_length=MAX_TARGETS
+    )
+
+class ViewerStateListSerializer(serializers.ListSerializer):
+    """Lets the child preload viewer state for the whole page at once"""
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        instances = list(iterable)
+        self.child.preload(instances)
+        return super().to_representation(instances)
+
+
+class ViewerReactionMixin:
+    """Answers user_has_liked / user_reaction from the viewer reaction loader"""
+
+    def preload(self, instances):
+        ViewerReactionLoader(self.context).prime(instances)
+
+    def get_user_has_liked(self, obj):
+        """Check if current user has reacted to this object"""
+        return self.get_user_reaction(obj) is not None
+
+    def get_user_reaction(self, obj):
+        """Get current user's reaction to this object"""
+        return ViewerReactionLoader(self.context).get(obj)
+
+
+class BufferedCountersMixin:
+    """Adds reaction deltas still waiting in the write-behind buffer"""
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if buffering_enabled() and 'likes_count' in data:
+            data['likes_count'], data['reaction_counts'] = counter_buffer.merge(
+                type(instance), instance.pk,
+                data['likes_count'], data.get('reaction_counts')
+            )
+        return data
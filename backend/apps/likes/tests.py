@@ -1,11 +1,16 @@
-from django.test import TestCase
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 
+from .buffer import counter_buffer
 from .models import Like
 from apps.posts.models import Post
+from apps.comments.models import Comment
 
 User = get_user_model()
 
@@ -82,6 +87,39 @@ class LikeTestCase(TestCase):
         self.assertEqual(response.data['total_count'], 1)
         self.assertIn('like', response.data['reactions'])
 
+    def test_get_likes_paginated_by_reaction(self):
+        """Test reaction totals and cursor pages of reactors per reaction"""
+        ct = ContentType.objects.get_for_model(Post)
+        for index in range(5):
+            user = User.objects.create_user(
+                email=f'reactor{index}@example.com',
+                username=f'reactor{index}',
+                password='testpass123'
+            )
+            Like.objects.create(
+                user=user,
+                content_type=ct,
+                object_id=self.post.id,
+                reaction_type='love' if index % 2 else 'like'
+            )
+
+        response = self.client.get(
+            f'/api/likes/post/{self.post.id}/?reaction=like&page_size=2'
+        )
+        self.assertEqual(response.data['reactions'], {'like': 3, 'love': 2})
+        self.assertEqual(response.data['total_count'], 5)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertTrue(all(
+            like['reaction_type'] == 'like' for like in response.data['results']
+        ))
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(f'/api/likes/post/{self.post.id}/?reaction=meh')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_check_user_reaction(self):
         """Test checking user's reaction"""
         # No reaction initially
@@ -94,4 +132,122 @@ class LikeTestCase(TestCase):
         # Check again
         response = self.client.get(f'/api/check/post/{self.post.id}/')
         self.assertTrue(response.data['liked'])
-        self.assertEqual(response.data['reaction'], 'like')
\ No newline at end of file
+        self.assertEqual(response.data['reaction'], 'like')
+
+    def test_check_user_reactions_batch(self):
+        """Test checking reactions on many objects with one Like query"""
+        comment = Comment.objects.create(
+            post=self.post,
+            author=self.user,
+            content='Test comment'
+        )
+        self.client.post(f'/api/like/post/{self.post.id}/', {'reaction_type': 'love'})
+        targets = [
+            {'content_type': 'post', 'object_id': self.post.id},
+            {'content_type': 'comment', 'object_id': comment.id},
+        ]
+
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                '/api/check/batch/', {'targets': targets}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['reactions'], {
+            'post': {str(self.post.id): 'love'},
+            'comment': {str(comment.id): None},
+        })
+
+        too_many = [{'content_type': 'post', 'object_id': i + 1} for i in range(301)]
+        response = self.client.post(
+            '/api/check/batch/', {'targets': too_many}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_like_targets(self):
+        """Test unknown, non-likeable, missing and deleted targets are rejected"""
+        response = self.client.post(f'/api/like/nonsense/{self.post.id}/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(f'/api/like/user/{self.user.id}/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(f'/api/like/post/{self.post.id + 1000}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.post.is_deleted = True
+        self.post.save()
+        response = self.client.post(f'/api/like/post/{self.post.id}/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Like.objects.exists())
+
+    def test_reaction_counters_follow_toggles(self):
+        """Test likes_count and the reaction breakdown are kept in step"""
+        self.client.post(f'/api/like/post/{self.post.id}/')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(self.post.reaction_counts, {'like': 1})
+
+        response = self.client.post(
+            f'/api/like/post/{self.post.id}/', {'reaction_type': 'love'}
+        )
+        self.assertEqual(response.data['likes_count'], 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(self.post.reaction_counts, {'love': 1})
+
+        self.client.post(f'/api/like/post/{self.post.id}/', {'reaction_type': 'love'})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+        self.assertEqual(self.post.reaction_counts, {})
+
+    def test_comment_likes_count(self):
+        """Test liking a comment updates the comment's counter"""
+        comment = Comment.objects.create(
+            post=self.post,
+            author=self.user,
+            content='Test comment'
+        )
+        response = self.client.post(f'/api/like/comment/{comment.id}/')
+
+        self.assertEqual(response.data['likes_count'], 1)
+        comment.refresh_from_db()
+        self.assertEqual(comment.likes_count, 1)
+        self.assertEqual(comment.reaction_counts, {'like': 1})
+
+    @override_settings(LIKE_COUNTER_BUFFER_ENABLED=True, LIKE_COUNTER_FLUSH_INTERVAL_MS=0)
+    def test_buffered_counters(self):
+        """Test buffered deltas are visible before and persisted after a flush"""
+        response = self.client.post(f'/api/like/post/{self.post.id}/')
+        self.assertEqual(response.data['likes_count'], 1)
+        self.assertEqual(response.data['reaction_counts'], {'like': 1})
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+        response = self.client.get(f'/api/posts/{self.post.id}/')
+        self.assertEqual(response.data['likes_count'], 1)
+
+        self.assertEqual(counter_buffer.flush(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(self.post.reaction_counts, {'like': 1})
+        self.assertEqual(counter_buffer.flush(), 0)
+
+    @override_settings(LIKE_COUNTER_BUFFER_ENABLED=True, LIKE_COUNTER_FLUSH_INTERVAL_MS=0)
+    def test_reconcile_like_counts(self):
+        """Test the reconcile command recovers deltas lost with their process"""
+        self.client.post(f'/api/like/post/{self.post.id}/', {'reaction_type': 'love'})
+        # A worker killed before flushing takes its pending deltas with it
+        counter_buffer._drain()
+        comment = Comment.objects.create(post=self.post, author=self.user, content='Test comment')
+        Comment.objects.filter(pk=comment.pk).update(likes_count=3, reaction_counts={'like': 3})
+
+        out = StringIO()
+        call_command('reconcile_like_counts', stdout=out)
+
+        self.post.refresh_from_db()
+        comment.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(self.post.reaction_counts, {'love': 1})
+        self.assertEqual(comment.likes_count, 0)
+        self.assertEqual(comment.reaction_counts, {})
+        self.assertIn('Fixed 2 reaction counters', out.getvalue())
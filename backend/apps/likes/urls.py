@@ -1,5 +1,5 @@
 from django.urls import include, path
-from .views import get_likes, toggle_like, check_user_reaction
+from .views import get_likes, toggle_like, check_user_reaction, check_user_reactions
 
 app_name = 'likes'
 
@@ -14,6 +14,11 @@ urlpatterns = [
         get_likes,
         name='get_likes'
     ),
+    path(
+        'check/batch/',
+        check_user_reactions,
+        name='check_reactions'
+    ),
     path(
         'check/<str:content_type>/<int:object_id>/',
         check_user_reaction,
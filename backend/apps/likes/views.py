@@ -1,85 +1,120 @@
 from rest_framework import status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from django.contrib.contenttypes.models import ContentType
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Count, Q
 
-from .models import Like
-from .serializers import LikeSerializer, ReactionSerializer
+from apps.comments.models import Comment
+from apps.notifications.fanout import enqueue
+from apps.notifications.models import NotificationType
 from apps.posts.models import Post
+from config.pagination import KeysetPagination
+
+from .buffer import buffering_enabled, counter_buffer
+from .counters import apply_reaction_change, has_counters
+from .models import Like
+from .registry import like_targets, target_state
+from .serializers import BatchReactionCheckSerializer, LikeSerializer, ReactionSerializer
+
+LIKE_NOTIFICATIONS = {
+    Post: NotificationType.POST_LIKE,
+    Comment: NotificationType.COMMENT_LIKE,
+}
+
+
+class LikePagination(KeysetPagination):
+    """Paginate reactors newest first"""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def toggle_like(request, content_type, object_id):
     """Toggle like on any object (post, comment, etc.)"""
 
-    # Get content type
-    try:
-        ct = ContentType.objects.get(model=content_type)
-    except ContentType.DoesNotExist:
+    target = like_targets.resolve(content_type)
+    if target is None or not target.likeable:
         return Response(
             {'error': 'Invalid content type'},
             status=status.HTTP_400_BAD_REQUEST
         )
-    
-    # Get the object being liked
-    try:
-        obj = ct.get_object_for_this_type(id=object_id)
-    except ct.model_class().DoesNotExist:
+
+    # Check the object exists and isn't deleted without loading it
+    state = target_state(target, object_id)
+    if state == 'missing':
         return Response(
             {'error': 'Object not found'},
             status=status.HTTP_404_NOT_FOUND
         )
-    
-    # Check if object is deleted (for posts)
-    if hasattr(obj, 'is_deleted') and obj.is_deleted:
+    if state == 'deleted':
         return Response(
             {'error': 'Cannot like deleted content'},
             status=status.HTTP_400_BAD_REQUEST
         )
-    
+
     serializer = ReactionSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
 
     reaction_type = serializer.validated_data['reaction_type']
+    model = target.model
 
-    # Check if user already reacted
-    like, created = Like.objects.get_or_create(
-        user=request.user,
-        content_type=ct,
-        object_id=object_id,
-        defaults={'reaction_type': reaction_type}
-    )
+    with transaction.atomic():
+        # Check if user already reacted
+        like, created = Like.objects.select_for_update().get_or_create(
+            user=request.user,
+            content_type_id=target.content_type_id,
+            object_id=object_id,
+            defaults={'reaction_type': reaction_type}
+        )
 
-    if not created:
-        if like.reaction_type == reaction_type:
-            # Same reaction - remove it (unlike)
-            like.delete()
-            liked = False
-            reaction = None
+        removed = None
+        if not created:
+            removed = like.reaction_type
+            if like.reaction_type == reaction_type:
+                # Same reaction - remove it (unlike)
+                like.delete()
+                liked = False
+                reaction = None
+            else:
+                # Different reaction - update it
+                like.reaction_type = reaction_type
+                like.save(update_fields=['reaction_type'])
+                liked = True
+                reaction = reaction_type
         else:
-            # Different reaction - update it
-            like.reaction_type = reaction_type
-            like.save()
+            # New reaction
             liked = True
             reaction = reaction_type
-    else:
-        # New reaction
-        liked = True
-        reaction = reaction_type
-
-    # Update counts for posts
-    if isinstance(obj, Post):
-        obj.like_count = Like.objects.filter(
-            content_type=ct,
-            object_id=obj.id
-        ).count()
-        obj.save(update_fields=['likes_count'])
+            if model in LIKE_NOTIFICATIONS:
+                enqueue(
+                    LIKE_NOTIFICATIONS[model],
+                    request.user,
+                    content_type_id=target.content_type_id,
+                    object_id=object_id
+                )
+
+        # Update counters in the same transaction as the like itself,
+        # or leave them to the write-behind buffer
+        likes_count, reaction_counts = 0, {}
+        if has_counters(model) and not buffering_enabled():
+            likes_count, reaction_counts = apply_reaction_change(
+                model, object_id, removed=removed, added=reaction
+            )
+
+    if has_counters(model) and buffering_enabled():
+        counter_buffer.add(model, object_id, removed=removed, added=reaction)
+        persisted = model.objects.values_list(
+            'likes_count', 'reaction_counts'
+        ).get(pk=object_id)
+        likes_count, reaction_counts = counter_buffer.merge(model, object_id, *persisted)
 
     return Response({
         'liked': liked,
         'reaction': reaction,
-        'likes_count': getattr(obj, 'likes_count', 0)
+        'likes_count': likes_count,
+        'reaction_counts': reaction_counts
     })
 
 
@@ -88,29 +123,43 @@ def toggle_like(request, content_type, object_id):
 def get_likes(request, content_type, object_id):
     """Get all likes for an object"""
 
-    try:
-        ct = ContentType.objects.get(model=content_type)
-    except ContentType.DoesNotExist:
+    target = like_targets.resolve(content_type)
+    if target is None or not target.likeable:
         return Response(
             {'error': 'Invalid content type'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
     likes = Like.objects.filter(
-        content_type=ct,
+        content_type_id=target.content_type_id,
         object_id=object_id,
-    ).select_related('user').order_by('-created_at')
+    )
+
+    # Per-reaction totals from one GROUP BY, without loading any rows
+    reactions = dict(
+        likes.order_by().values('reaction_type').annotate(
+            total=Count('id')
+        ).values_list('reaction_type', 'total')
+    )
 
-    # Group by reaction type
-    reactions = {}
-    for like in likes:
-        if like.reaction_type not in reactions:
-            reactions[like.reaction_type] = []
-            reactions[like.reaction_type].append(LikeSerializer(like).data)
+    # One page of reactors, optionally for a single reaction type
+    reaction_type = request.query_params.get('reaction')
+    if reaction_type is not None:
+        if reaction_type not in dict(Like.REACTION_TYPES):
+            return Response(
+                {'error': 'Invalid reaction type'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        likes = likes.filter(reaction_type=reaction_type)
+
+    paginator = LikePagination()
+    page = paginator.paginate_queryset(likes.select_related('user'), request)
 
     return Response({
         'reactions': reactions,
-        'total_count': likes.count()
+        'total_count': sum(reactions.values()),
+        'next': paginator.get_next_link(),
+        'results': LikeSerializer(page, many=True).data
     })
 
 @api_view(['GET'])
@@ -118,18 +167,17 @@ def get_likes(request, content_type, object_id):
 def check_user_reaction(request, content_type, object_id):
     """Check if current user has reacted to an object"""
 
-    try: 
-        ct = ContentType.objects.get(model=content_type)
-    except ContentType.DoesNotExist:
+    target = like_targets.resolve(content_type)
+    if target is None or not target.likeable:
         return Response(
-            {'error': 'Invalid content type'}, 
+            {'error': 'Invalid content type'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
     try:
         like = Like.objects.get(
             user=request.user,
-            content_type=ct,
+            content_type_id=target.content_type_id,
             object_id=object_id
         )
         return Response({
@@ -140,4 +188,47 @@ def check_user_reaction(request, content_type, object_id):
         return Response({
             'liked': False,
             'reaction': None
-        })
\ No newline at end of file
+        })
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def check_user_reactions(request):
+    """Check the current user's reactions on many objects in one request"""
+
+    serializer = BatchReactionCheckSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    # Group requested IDs by content type
+    object_ids = {}
+    for item in serializer.validated_data['targets']:
+        target = like_targets.resolve(item['content_type'])
+        if target is None or not target.likeable:
+            return Response(
+                {'error': f"Invalid content type: {item['content_type']}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        object_ids.setdefault(
+            (item['content_type'], target.content_type_id), set()
+        ).add(item['object_id'])
+
+    condition = Q()
+    for (_, content_type_id), ids in object_ids.items():
+        condition |= Q(content_type_id=content_type_id, object_id__in=ids)
+
+    found = {
+        (content_type_id, object_id): reaction_type
+        for content_type_id, object_id, reaction_type in Like.objects.filter(
+            condition, user=request.user
+        ).values_list('content_type_id', 'object_id', 'reaction_type')
+    }
+
+    # {"post": {"12": "love", "13": null}, "comment": {...}}
+    return Response({
+        'reactions': {
+            slug: {
+                str(object_id): found.get((content_type_id, object_id))
+                for object_id in sorted(ids)
+            }
+            for (slug, content_type_id), ids in object_ids.items()
+        }
+    })
@@ -1,6 +1,6 @@
 from django.apps import AppConfig
 
 
-class NotificatonsConfig(AppConfig):
+class NotificationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.notificatons'
+    name = 'apps.notifications'
@@ -0,0 +1,181 @@
+"""
+Live notification delivery.
+
+Every connected client of a user joins the user's channel layer group and
+receives each new Notification with the updated counts, and fresh counts
+whenever notifications are read, seen or deleted.
+
+Backpressure: each connection has a bounded queue in the channel layer
+(CHANNEL_LAYERS capacity). Once a slow client's queue is full, further
+events for that client are dropped instead of blocking the publisher or
+other clients. Every event carries absolute counts, so the next event
+delivered corrects the badge. Clients re-fetch the list when they
+reconnect.
+"""
+
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from channels.exceptions import StopConsumer
+from channels.generic.http import AsyncHttpConsumer
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from config.streams import EventStreamConsumer, publish
+
+from .models import Notification
+from .serializers import NotificationSerializer
+from .sync import changes_since
+
+
+def user_group(user_id):
+    return f'notifications_{user_id}'
+
+
+def publish_notification(notification):
+    publish_notifications([notification])
+
+
+def publish_notifications(notifications):
+    """Publish a batch, computing each recipient's counts once"""
+    counts = {}
+    for notification in notifications:
+        recipient_id = notification.recipient_id
+        if recipient_id not in counts:
+            counts[recipient_id] = Notification.counts_for(recipient_id)
+        publish(user_group(recipient_id), 'notification.created', {
+            'notification': NotificationSerializer(notification).data,
+            # A resurfaced group is a new row standing in for this one
+            'replaces': getattr(notification, '_replaces', None),
+            'counts': counts[recipient_id],
+        })
+
+
+def publish_counts(user_id):
+    publish(user_group(user_id), 'counts.updated', Notification.counts_for(user_id))
+
+
+class NotificationStreamMixin:
+    """Joins the connected user's group and starts them off with their counts"""
+
+    @database_sync_to_async
+    def get_counts(self, user_id):
+        return Notification.counts_for(user_id)
+
+    def get_user(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            return None
+        return user
+
+
+class NotificationStreamConsumer(NotificationStreamMixin, EventStreamConsumer):
+    """Server-sent events for the current user's notifications"""
+
+    async def get_groups(self):
+        self.user = self.get_user()
+        if self.user is None:
+            await self.send_json_response(401, {'error': 'Authentication required'})
+            return None
+        return [user_group(self.user.id)]
+
+    async def on_open(self):
+        counts = await self.get_counts(self.user.id)
+        await self.send_event('counts.updated', json.dumps(counts))
+
+
+class NotificationSocketConsumer(NotificationStreamMixin, AsyncWebsocketConsumer):
+    """The same events over a WebSocket, as {"event": ..., "data": ...} frames"""
+
+    async def connect(self):
+        self.user = self.get_user()
+        if self.user is None:
+            await self.close(code=4401)
+            return
+        self.group = user_group(self.user.id)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept()
+        counts = await self.get_counts(self.user.id)
+        await self.send(text_data=json.dumps({'event': 'counts.updated', 'data': counts}))
+
+    async def disconnect(self, code):
+        if getattr(self, 'group', None):
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+
+    async def stream_event(self, message):
+        # data is already JSON encoded, so splice it in rather than re-encode
+        await self.send(
+            text_data=f'{{"event": {json.dumps(message["event"])}, "data": {message["data"]}}}'
+        )
+
+
+class NotificationSyncConsumer(NotificationStreamMixin, AsyncHttpConsumer):
+    """
+    Delta sync with long-polling: with ?wait=<seconds>, a request that
+    finds nothing new is held open until something is published to the
+    user's group or the wait runs out, then answered with the changes
+    """
+
+    async def http_request(self, message):
+        if 'body' in message:
+            self.body.append(message['body'])
+        if message.get('more_body'):
+            return
+
+        self.user = self.get_user()
+        if self.user is None:
+            await self.respond(401, {'error': 'Authentication required'})
+
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        self.cursor = query.get('cursor', [None])[0]
+        try:
+            wait = float(query.get('wait', [0])[0])
+        except ValueError:
+            await self.respond(400, {'error': 'wait must be a number of seconds'})
+        wait = min(max(wait, 0), getattr(settings, 'NOTIFICATION_SYNC_MAX_WAIT', 30))
+
+        self.group = self.timeout = None
+        if wait and self.cursor is not None:
+            # Join before looking so nothing published in between is missed
+            self.group = user_group(self.user.id)
+            await self.channel_layer.group_add(self.group, self.channel_name)
+
+        status, data = await self.get_changes()
+        if self.group is None or status != 200 or data['notifications'] or data['deleted']:
+            await self.respond(status, data)
+        self.timeout = asyncio.create_task(self.expire(wait))
+
+    @database_sync_to_async
+    def get_changes(self):
+        return changes_since(self.user.id, self.cursor)
+
+    async def expire(self, wait):
+        await asyncio.sleep(wait)
+        # Answer from the consumer's own loop rather than this task
+        await self.channel_layer.send(self.channel_name, {'type': 'sync.expired'})
+
+    async def respond(self, status, data):
+        await self.send_response(
+            status,
+            json.dumps(data, cls=DjangoJSONEncoder).encode(),
+            headers=[(b'Content-Type', b'application/json')]
+        )
+        await self.disconnect()
+        raise StopConsumer()
+
+    async def stream_event(self, message):
+        # Anything published for the user may change what the client holds
+        await self.respond(*await self.get_changes())
+
+    async def sync_expired(self, message):
+        await self.respond(*await self.get_changes())
+
+    async def disconnect(self):
+        if getattr(self, 'timeout', None) is not None:
+            self.timeout.cancel()
+        if getattr(self, 'group', None) is not None:
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+            self.group = None
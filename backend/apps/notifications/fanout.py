@@ -0,0 +1,429 @@
+"""
+Notification fan-out.
+
+Write endpoints only call enqueue(), which inserts a NotificationJob in the
+same transaction as the action itself. The notification worker claims
+batches of jobs, resolves who should hear about each event, drops
+recipients whose preferences turn that kind of notification off and
+bulk-creates the Notification rows, so request latency doesn't depend on
+any of it.
+
+The worker publishes the new notifications to connected clients itself.
+It runs in its own process, so that only works through a channel layer
+shared with the ASGI server (REDIS_URL); run_notification_worker refuses
+to start on the in-memory layer unless told to run without push.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import (
+    Notification,
+    NotificationCounter,
+    NotificationJob,
+    NotificationPreference,
+    NotificationTombstone,
+    NotificationType
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+# Jobs claimed longer ago than this belonged to a worker that died
+STALE_AFTER = timedelta(minutes=5)
+
+# notification type -> (title, message, in-app preference field)
+TEMPLATES = {
+    NotificationType.POST_LIKE: (
+        'New reaction', '{actor} reacted to your post', 'inapp_post_likes'
+    ),
+    NotificationType.COMMENT_LIKE: (
+        'New reaction', '{actor} reacted to your comment', 'inapp_post_likes'
+    ),
+    NotificationType.POST_COMMENT: (
+        'New comment', '{actor} commented on your post', 'inapp_comments'
+    ),
+    NotificationType.COMMENT_REPLY: (
+        'New reply', '{actor} replied to your comment', 'inapp_comments'
+    ),
+    NotificationType.FRIEND_REQUEST: (
+        'New friend request', '{actor} sent you a friend request', 'inapp_friend_requests'
+    ),
+    NotificationType.FRIEND_ACCEPT: (
+        'Friend request accepted', '{actor} accepted your friend request', 'inapp_friend_requests'
+    ),
+}
+
+
+# Types folded into one "A and N others ..." notification per object
+COALESCED_TYPES = {
+    NotificationType.POST_LIKE,
+    NotificationType.COMMENT_LIKE,
+    NotificationType.POST_COMMENT,
+    NotificationType.COMMENT_REPLY,
+}
+RECENT_ACTORS = 3
+# Actor IDs kept per group to count distinct actors; past this many the
+# oldest are forgotten and may be counted again if they come back
+MAX_TRACKED_ACTORS = 1000
+# Types where a repeat by someone already in the group is still news
+RESURFACE_ON_REPEAT = {
+    NotificationType.POST_COMMENT,
+    NotificationType.COMMENT_REPLY,
+}
+ACTOR_KEYS = ('actors', 'actor_ids', 'actor_count')
+# Passes over a batch when racing workers keep opening its groups first
+GROUP_WRITE_ATTEMPTS = 3
+
+
+def coalesce_window():
+    return timedelta(hours=getattr(settings, 'NOTIFICATION_COALESCE_WINDOW_HOURS', 24))
+
+
+def enqueue(notification_type, actor, target=None, content_type_id=None,
+            object_id=None, **payload):
+    """
+    Record an event for the worker. Pass the target object, or its
+    content_type_id and object_id when it isn't loaded. Without a
+    recipient_id in payload, the target's author is notified.
+    """
+    if target is not None:
+        content_type_id = ContentType.objects.get_for_model(target).id
+        object_id = target.pk
+    return NotificationJob.objects.create(
+        notification_type=notification_type,
+        actor=actor,
+        content_type_id=content_type_id,
+        object_id=object_id,
+        payload=payload
+    )
+
+
+def claim_jobs(limit):
+    """Lock up to limit runnable jobs for this worker"""
+    now = timezone.now()
+    with transaction.atomic():
+        job_ids = list(NotificationJob.objects.select_for_update(skip_locked=True).filter(
+            Q(status='pending', run_after__lte=now)
+            | Q(status='processing', locked_at__lt=now - STALE_AFTER)
+        ).order_by('id').values_list('id', flat=True)[:limit])
+        NotificationJob.objects.filter(id__in=job_ids).update(
+            status='processing',
+            locked_at=now,
+            attempts=F('attempts') + 1
+        )
+    return list(NotificationJob.objects.filter(id__in=job_ids).select_related('actor'))
+
+
+def load_targets(jobs):
+    """(content_type_id, object_id) -> live target, for jobs that need one"""
+    object_ids = {}
+    for job in jobs:
+        if 'recipient_id' not in job.payload and job.object_id is not None:
+            object_ids.setdefault(job.content_type_id, set()).add(job.object_id)
+
+    targets = {}
+    for content_type_id, ids in object_ids.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        objects = model.objects.filter(pk__in=ids)
+        if any(field.name == 'is_deleted' for field in model._meta.get_fields()):
+            objects = objects.filter(is_deleted=False)
+        for obj in objects:
+            targets[content_type_id, obj.pk] = obj
+    return targets
+
+
+def allowed(notifications):
+    """Notifications whose recipients haven't switched that kind off"""
+    masks = NotificationPreference.masks_for({n.recipient_id for n in notifications})
+    return [
+        n for n in notifications
+        if NotificationPreference.allows(
+            masks[n.recipient_id], TEMPLATES[n.notification_type][2]
+        )
+    ]
+
+
+def build_notifications(jobs):
+    """Unsaved Notification rows for a batch of jobs, preferences applied"""
+    targets = load_targets(jobs)
+
+    notifications = []
+    for job in jobs:
+        recipient_id = job.payload.get('recipient_id')
+        if recipient_id is None:
+            target = targets.get((job.content_type_id, job.object_id))
+            recipient_id = getattr(target, 'author_id', None)
+        # Nobody to tell, or people acting on their own content
+        if recipient_id is None or recipient_id == job.actor_id:
+            continue
+
+        title, message, _ = TEMPLATES[job.notification_type]
+        notifications.append(Notification(
+            recipient_id=recipient_id,
+            sender_id=job.actor_id,
+            notification_type=job.notification_type,
+            title=title,
+            message=message.format(actor=job.actor.username),
+            content_type_id=job.content_type_id,
+            object_id=job.object_id,
+            extra_data={
+                **job.payload.get('extra_data', {}),
+                'actor_count': 1,
+                'actors': [{'id': job.actor_id, 'username': job.actor.username}],
+                'actor_ids': [job.actor_id],
+            }
+        ))
+
+    if not notifications:
+        return []
+    return allowed(notifications)
+
+
+def group_key(notification):
+    return (
+        notification.recipient_id,
+        notification.notification_type,
+        notification.content_type_id,
+        notification.object_id,
+    )
+
+
+def describe(notification):
+    """Message naming the newest actor and how many others there were"""
+    data = notification.extra_data
+    names = [actor['username'] for actor in data['actors']]
+    if data['actor_count'] == 1 or not names:
+        who = names[0] if names else 'Someone'
+    elif data['actor_count'] == 2 and len(names) == 2:
+        who = f'{names[0]} and {names[1]}'
+    else:
+        others = data['actor_count'] - 1
+        who = f"{names[0]} and {others} other{'s' if others > 1 else ''}"
+    return TEMPLATES[notification.notification_type][1].format(actor=who)
+
+
+def merge_actors(into, other):
+    """
+    Fold other's actors into into, newest first, counting each distinct
+    actor once; False if none were new
+    """
+    data = into.extra_data
+    data.setdefault('actors', [])
+    data.setdefault('actor_count', 1)
+    data.setdefault('actor_ids', [actor['id'] for actor in data['actors']])
+    incoming = other.extra_data['actors']
+    incoming_ids = other.extra_data.get('actor_ids') or [actor['id'] for actor in incoming]
+
+    known = set(data['actor_ids'])
+    fresh = [actor_id for actor_id in incoming_ids if actor_id not in known]
+    data['actor_count'] += other.extra_data['actor_count'] - (len(incoming_ids) - len(fresh))
+
+    # Whoever acted last moves to the front, new or not
+    moved = set(incoming_ids)
+    data['actors'] = (
+        incoming + [actor for actor in data['actors'] if actor['id'] not in moved]
+    )[:RECENT_ACTORS]
+    data['actor_ids'] = (
+        incoming_ids + [actor_id for actor_id in data['actor_ids'] if actor_id not in moved]
+    )[:MAX_TRACKED_ACTORS]
+    into.sender_id = other.sender_id
+    into.message = describe(into)
+    return bool(fresh)
+
+
+def merge_group(into, other):
+    """Fold other into into's group; True if the group should resurface"""
+    fresh = merge_actors(into, other)
+    if into.notification_type not in RESURFACE_ON_REPEAT:
+        # Someone already in the group reacting again isn't news
+        return fresh
+    # Every new comment is; link to the newest one
+    into.extra_data.update(
+        (key, value) for key, value in other.extra_data.items() if key not in ACTOR_KEYS
+    )
+    return True
+
+
+def resurface(row):
+    """
+    A new unread row carrying a group forward; the old row is deleted, so
+    lists and synced clients see the group move to the top
+    """
+    notification = Notification(
+        recipient_id=row.recipient_id,
+        sender_id=row.sender_id,
+        notification_type=row.notification_type,
+        title=row.title,
+        message=row.message,
+        content_type_id=row.content_type_id,
+        object_id=row.object_id,
+        extra_data=row.extra_data,
+        is_open_group=True
+    )
+    notification._replaces = row.id
+    return notification
+
+
+def coalesce(notifications):
+    """
+    Fold notifications about the same object into one per recipient: first
+    within the batch, then into the recipient's open group for the object
+    if it was created within the coalescing window. Groups past the window
+    are closed and a new one opens. Returns (rows to create, existing rows
+    they replace).
+    """
+    to_create = []
+    grouped = {}
+    for notification in notifications:
+        if notification.notification_type not in COALESCED_TYPES:
+            to_create.append(notification)
+            continue
+        key = group_key(notification)
+        if key in grouped:
+            merge_group(grouped[key], notification)
+        else:
+            notification.is_open_group = True
+            grouped[key] = notification
+    if not grouped:
+        return to_create, []
+
+    # A superset of the keys in one indexed query, matched up below
+    existing = {}
+    for row in Notification.objects.select_for_update().filter(
+        recipient_id__in={key[0] for key in grouped},
+        notification_type__in={key[1] for key in grouped},
+        object_id__in={key[3] for key in grouped},
+        is_open_group=True
+    ):
+        existing[group_key(row)] = row
+
+    cutoff = timezone.now() - coalesce_window()
+    expired = []
+    replaced = []
+    for key, notification in grouped.items():
+        row = existing.get(key)
+        if row is not None and row.created_at < cutoff:
+            expired.append(row.id)
+            row = None
+        if row is None:
+            to_create.append(notification)
+        elif merge_group(row, notification):
+            to_create.append(resurface(row))
+            replaced.append(row)
+    if expired:
+        Notification.objects.filter(id__in=expired).update(is_open_group=False)
+    return to_create, replaced
+
+
+def update_counters(created, replaced):
+    """Move badge counters for new rows and the rows they replaced"""
+    deltas = {}
+    for notification in created:
+        total, unread, unseen = deltas.get(notification.recipient_id, (0, 0, 0))
+        deltas[notification.recipient_id] = (total + 1, unread + 1, unseen + 1)
+    watermarks = NotificationCounter.watermarks_for(
+        {notification.recipient_id for notification in replaced}
+    )
+    for notification in replaced:
+        is_read, is_seen = notification.effective_flags(
+            notification.is_read,
+            notification.is_seen,
+            watermarks[notification.recipient_id]
+        )
+        total, unread, unseen = deltas.get(notification.recipient_id, (0, 0, 0))
+        deltas[notification.recipient_id] = (
+            total - 1, unread - int(not is_read), unseen - int(not is_seen)
+        )
+
+    for user_id, (total, unread, unseen) in deltas.items():
+        NotificationCounter.adjust(user_id, total=total, unread=unread, unseen=unseen)
+
+
+def write_notifications(jobs):
+    """
+    Create a batch's notifications, replacing the groups they resurface.
+    Raises IntegrityError if another worker opened one of the same groups
+    first; the caller retries, folding into that group instead.
+    """
+    with transaction.atomic():
+        to_create, replaced = coalesce(build_notifications(jobs))
+        # Synced clients learn about the replaced rows from their tombstones
+        NotificationTombstone.objects.bulk_create([
+            NotificationTombstone(recipient_id=row.recipient_id, notification_id=row.id)
+            for row in replaced
+        ])
+        Notification.objects.filter(id__in=[row.id for row in replaced]).delete()
+        created = Notification.objects.bulk_create(to_create, batch_size=500)
+        update_counters(created, replaced)
+    return created
+
+
+def process_jobs(jobs):
+    """Turn a batch of claimed jobs into notifications, retrying on failure"""
+    from .consumers import publish_notifications
+
+    job_ids = [job.id for job in jobs]
+    try:
+        with transaction.atomic():
+            for attempt in range(GROUP_WRITE_ATTEMPTS):
+                try:
+                    created = write_notifications(jobs)
+                    break
+                except IntegrityError:
+                    # The other group is committed now, so the next pass sees it
+                    if attempt == GROUP_WRITE_ATTEMPTS - 1:
+                        raise
+            NotificationJob.objects.filter(id__in=job_ids).delete()
+            transaction.on_commit(lambda: publish_notifications(created))
+    except Exception as exc:
+        logger.exception("Failed to process notification jobs %s", job_ids)
+        fail_jobs(jobs, exc)
+
+
+def fail_jobs(jobs, exc):
+    """Retry with exponential backoff, giving up after MAX_ATTEMPTS"""
+    now = timezone.now()
+    for job in jobs:
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = 'failed'
+        else:
+            job.status = 'pending'
+            job.run_after = now + timedelta(seconds=2 ** job.attempts)
+        job.locked_at = None
+        job.last_error = repr(exc)
+    NotificationJob.objects.bulk_update(
+        jobs, ['status', 'run_after', 'locked_at', 'last_error']
+    )
+
+
+def _process_in_thread(jobs):
+    try:
+        process_jobs(jobs)
+    finally:
+        # Worker threads own their connections
+        connections.close_all()
+
+
+def process_pending_jobs(batch_size=100, workers=1):
+    """
+    Claim up to batch_size jobs per worker thread and process them.
+    Returns the number of jobs claimed.
+    """
+    jobs = claim_jobs(batch_size * workers)
+    batches = [jobs[start:start + batch_size] for start in range(0, len(jobs), batch_size)]
+
+    if workers <= 1:
+        for batch in batches:
+            process_jobs(batch)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(_process_in_thread, batches))
+    return len(jobs)
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from apps.notifications.retention import prune, prune_tombstones
+
+
+class Command(BaseCommand):
+    help = "Delete notifications older than their type's retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Notifications deleted per transaction (default NOTIFICATION_PRUNE_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--archive',
+            action='store_true',
+            default=None,
+            help='Copy expired read notifications to the archive table first'
+        )
+        parser.add_argument(
+            '--no-archive',
+            action='store_false',
+            dest='archive',
+            help='Delete without archiving, whatever NOTIFICATION_ARCHIVE_ENABLED says'
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Seconds to sleep between batches'
+        )
+
+    def handle(self, *args, **options):
+        deleted, archived = prune(
+            batch_size=options['batch_size'],
+            archive=options['archive'],
+            pause=options['pause']
+        )
+        tombstones = prune_tombstones(
+            batch_size=options['batch_size'],
+            pause=options['pause']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted} notifications, archived {archived}, "
+            f"cleared {tombstones} tombstones"
+        ))
@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.notifications.fanout import process_pending_jobs
+from config.streams import layer_is_shared
+
+
+class Command(BaseCommand):
+    help = (
+        "Turn queued notification jobs into notifications. The worker runs "
+        "in its own process, so live push needs a shared channel layer "
+        "(set REDIS_URL)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Threads processing batches in parallel'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Jobs per batch'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when the queue is empty'
+        )
+        parser.add_argument(
+            '--without-push',
+            action='store_true',
+            help='Run without a shared channel layer; connected clients are not notified live'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue once and exit'
+        )
+
+    def handle(self, *args, **options):
+        if not layer_is_shared():
+            if not options['without_push']:
+                # Events would stay in this process and never reach a client
+                raise CommandError(
+                    "The channel layer is in-memory, so notifications published by "
+                    "this worker can't reach the ASGI server. Set REDIS_URL, or pass "
+                    "--without-push to run anyway."
+                )
+            self.stderr.write(self.style.WARNING(
+                "In-memory channel layer: notifications will not be pushed live"
+            ))
+
+        total = 0
+        while True:
+            claimed = process_pending_jobs(options['batch_size'], options['workers'])
+            total += claimed
+            if claimed:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} notification jobs"))
@@ -0,0 +1,531 @@
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import models, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+User = get_user_model()
+
+class NotificationType(models.TextChoices):
+    POST_LIKE = 'post_like', 'Post Like'
+    POST_COMMENT = 'post_comment', 'Post Comment'
+    POST_SHARE = 'post_share', 'Post Share'
+    FRIEND_REQUEST = 'friend_request', 'Friend Request'
+    FRIEND_ACCEPT = 'friend_accept', 'Friend Accept'
+    COMMENT_LIKE = 'comment_like', 'Comment Like'
+    COMMENT_REPLY = 'comment_reply', 'Comment Reply'
+    MENTION = 'mention', 'Mention'
+    BIRTHDAY = 'birthday', 'Birthday'
+    EVENT_INVITE = 'event_invite', 'Event Invite'
+
+class Notification(models.Model):
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notifications'
+    )
+    sender = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='sent_notifications',
+        null=True,
+        blank=True
+    )
+
+    notification_type = models.CharField(
+        max_length=20,
+        choices=NotificationType.choices
+    )
+
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+
+    # Generic foreign key for linking to any model (Post, Comment, etc)
+    content_type = models.ForeignKey(
+        ContentType,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True
+    )
+    object_id = models.PositiveIntegerField(null=True, blank=True)
+    content_object = GenericForeignKey('content_type', 'object_id')
+
+    # Additional data stored as JSON
+    extra_data = models.JSONField(default=dict, blank=True)
+
+    is_read = models.BooleanField(default=False)
+    is_seen = models.BooleanField(default=False)
+
+    # A coalesced notification still taking in new actors; at most one per
+    # recipient and object, so racing workers can't both open a group
+    is_open_group = models.BooleanField(default=False)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', '-created_at']),
+            models.Index(fields=['recipient', 'is_read']),
+            # Retention pruning walks each type's expired rows
+            models.Index(fields=['notification_type', 'created_at']),
+            # Delta sync walks a user's changes in (updated_at, id) order
+            models.Index(fields=['recipient', 'updated_at', 'id']),
+        ]
+        constraints = [
+            # Also the index for finding the group a notification folds into
+            models.UniqueConstraint(
+                fields=['recipient', 'notification_type', 'content_type', 'object_id'],
+                condition=Q(is_open_group=True),
+                name='unique_open_notification_group'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.title} - {self.recipient.username}"
+
+    # (is_read, is_seen) as last read from or written to the database
+    _stored_flags = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_flags = (
+            instance.__dict__.get('is_read'),
+            instance.__dict__.get('is_seen'),
+        )
+        return instance
+
+    @classmethod
+    def aggregate_counts(cls, user_id, last_read_at=None, last_seen_at=None):
+        """
+        Total, unread and unseen counts in one conditional aggregate; only
+        rows above the watermarks can be unread or unseen
+        """
+        unread = Q(is_read=False)
+        if last_read_at is not None:
+            unread &= Q(created_at__gt=last_read_at)
+        unseen = Q(is_seen=False)
+        if last_seen_at is not None:
+            unseen &= Q(created_at__gt=last_seen_at)
+        return cls.objects.filter(recipient_id=user_id).aggregate(
+            total_count=Count('id'),
+            unread_count=Count('id', filter=unread),
+            unseen_count=Count('id', filter=unseen),
+        )
+
+    @classmethod
+    def counts_for(cls, user_id):
+        """Badge counts from the user's counter row, built on first use"""
+        counts = NotificationCounter.objects.filter(user_id=user_id).values(
+            'total_count', 'unread_count', 'unseen_count'
+        ).first()
+        return counts if counts is not None else NotificationCounter.rebuild(user_id)
+
+    def save(self, *args, **kwargs):
+        is_new = self.pk is None
+        update_fields = kwargs.get('update_fields')
+        writes_flags = update_fields is None or {'is_read', 'is_seen'} & set(update_fields)
+
+        with transaction.atomic():
+            before = (self.is_read, self.is_seen)
+            if not is_new and writes_flags and self._stored_flags != before:
+                # Re-read under a row lock so racing updates are counted once
+                before = Notification.objects.select_for_update().values_list(
+                    'is_read', 'is_seen'
+                ).get(pk=self.pk)
+
+            super().save(*args, **kwargs)
+            self._stored_flags = (self.is_read, self.is_seen)
+
+            if is_new:
+                NotificationCounter.adjust(
+                    self.recipient_id,
+                    total=1,
+                    unread=int(not self.is_read),
+                    unseen=int(not self.is_seen)
+                )
+            elif before != (self.is_read, self.is_seen):
+                watermarks = NotificationCounter.watermarks_for([self.recipient_id])
+                was_read, was_seen = self.effective_flags(
+                    *before, watermarks[self.recipient_id]
+                )
+                is_read, is_seen = self.effective_flags(
+                    self.is_read, self.is_seen, watermarks[self.recipient_id]
+                )
+                NotificationCounter.adjust(
+                    self.recipient_id,
+                    unread=int(was_read) - int(is_read),
+                    unseen=int(was_seen) - int(is_seen)
+                )
+
+        if is_new:
+            from .consumers import publish_notification
+            transaction.on_commit(lambda: publish_notification(self))
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            # Synced clients learn about the delete from the tombstone
+            NotificationTombstone.objects.create(
+                recipient_id=self.recipient_id,
+                notification_id=self.pk
+            )
+            result = super().delete(*args, **kwargs)
+            is_read, is_seen = self.effective_flags(
+                self.is_read,
+                self.is_seen,
+                NotificationCounter.watermarks_for([self.recipient_id])[self.recipient_id]
+            )
+            NotificationCounter.adjust(
+                self.recipient_id,
+                total=-1,
+                unread=-int(not is_read),
+                unseen=-int(not is_seen)
+            )
+        return result
+
+    def effective_flags(self, is_read, is_seen, watermarks, created_at=None):
+        """
+        (read, seen) once the recipient's (last_read_at, last_seen_at)
+        watermarks are applied; per-row flags only record reads above them
+        """
+        created_at = created_at or self.created_at
+        last_read_at, last_seen_at = watermarks
+        return (
+            is_read or (last_read_at is not None and created_at <= last_read_at),
+            is_seen or (last_seen_at is not None and created_at <= last_seen_at),
+        )
+    
+    def mark_as_read(self):
+        self.is_read = True
+        self.save(update_fields=['is_read', 'updated_at'])
+    
+    def mark_as_seen(self):
+        self.is_seen = True
+        self.save(update_fields=['is_seen', 'updated_at'])
+
+
+class NotificationCounter(models.Model):
+    """
+    Per-user badge counts, moved in the same transaction as the
+    notification changes that affect them, and the "mark all" watermarks:
+    everything created up to last_read_at / last_seen_at counts as read /
+    seen whatever its own flags say
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+'
+    )
+    total_count = models.PositiveIntegerField(default=0)
+    unread_count = models.PositiveIntegerField(default=0)
+    unseen_count = models.PositiveIntegerField(default=0)
+    last_read_at = models.DateTimeField(null=True, blank=True)
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Notification counts for user {self.user_id}"
+
+    @classmethod
+    def watermarks_for(cls, user_ids):
+        """user ID -> (last_read_at, last_seen_at)"""
+        watermarks = {user_id: (None, None) for user_id in user_ids}
+        for user_id, last_read_at, last_seen_at in cls.objects.filter(
+            user_id__in=user_ids
+        ).values_list('user_id', 'last_read_at', 'last_seen_at'):
+            watermarks[user_id] = (last_read_at, last_seen_at)
+        return watermarks
+
+    @classmethod
+    def rebuild(cls, user_id):
+        """Recount from the notifications table and store the result"""
+        counts = Notification.aggregate_counts(user_id, *cls.watermarks_for([user_id])[user_id])
+        cls.objects.update_or_create(user_id=user_id, defaults=counts)
+        return counts
+
+    @classmethod
+    def mark_all(cls, user_id, state):
+        """
+        Mark everything 'read' or 'seen' by moving the watermark to now, a
+        single-row write. Returns how many notifications that cleared.
+        """
+        watermark, count_field = {
+            'read': ('last_read_at', 'unread_count'),
+            'seen': ('last_seen_at', 'unseen_count'),
+        }[state]
+        with transaction.atomic():
+            counter = cls.objects.select_for_update().filter(user_id=user_id).first()
+            if counter is None:
+                cls.rebuild(user_id)
+                counter = cls.objects.select_for_update().get(user_id=user_id)
+            cleared = getattr(counter, count_field)
+            setattr(counter, watermark, timezone.now())
+            setattr(counter, count_field, 0)
+            counter.save(update_fields=[watermark, count_field])
+        return cleared
+
+    @classmethod
+    def adjust(cls, user_id, total=0, unread=0, unseen=0):
+        """Apply deltas, creating the row from a recount if it's missing"""
+        if not (total or unread or unseen):
+            return
+        updated = cls.objects.filter(user_id=user_id).update(
+            total_count=Greatest(F('total_count') + total, 0),
+            unread_count=Greatest(F('unread_count') + unread, 0),
+            unseen_count=Greatest(F('unseen_count') + unseen, 0),
+        )
+        if not updated:
+            # The recount already includes the change being applied
+            cls.rebuild(user_id)
+
+
+class NotificationTombstone(models.Model):
+    """
+    Marks a deleted notification for clients syncing changes; cleared by
+    the retention pruner after NOTIFICATION_TOMBSTONE_DAYS
+    """
+
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    notification_id = models.PositiveIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['deleted_at', 'id']
+        indexes = [
+            models.Index(fields=['recipient', 'deleted_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"Deleted notification {self.notification_id}"
+
+
+class NotificationPreference(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notification_preferences'
+    )
+
+    # Email notifications
+    email_post_likes = models.BooleanField(default=True)
+    email_comments = models.BooleanField(default=True)
+    email_friend_requests = models.BooleanField(default=True)
+    email_mentions = models.BooleanField(default=True)
+    
+    # Push notifications
+    push_post_likes = models.BooleanField(default=True)
+    push_comments = models.BooleanField(default=True)
+    push_friend_requests = models.BooleanField(default=True)
+    push_mentions = models.BooleanField(default=True)
+    
+    # In-app notifications
+    inapp_post_likes = models.BooleanField(default=True)
+    inapp_comments = models.BooleanField(default=True)
+    inapp_friend_requests = models.BooleanField(default=True)
+    inapp_mentions = models.BooleanField(default=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Preferences for {self.user.username}"
+
+    # Bit i of a preference mask is FIELDS[i]; never reorder, only append
+    FIELDS = (
+        'email_post_likes', 'email_comments', 'email_friend_requests', 'email_mentions',
+        'push_post_likes', 'push_comments', 'push_friend_requests', 'push_mentions',
+        'inapp_post_likes', 'inapp_comments', 'inapp_friend_requests', 'inapp_mentions',
+    )
+    # Users without a row get the field defaults: everything on
+    DEFAULT_MASK = (1 << len(FIELDS)) - 1
+
+    @staticmethod
+    def cache_key(user_id):
+        return f'notification_prefs:v1:{user_id}'
+
+    @classmethod
+    def encode(cls, values):
+        """Pack a sequence of booleans, in FIELDS order, into a mask"""
+        return sum(1 << bit for bit, enabled in enumerate(values) if enabled)
+
+    @classmethod
+    def allows(cls, mask, field):
+        return bool(mask & (1 << cls.FIELDS.index(field)))
+
+    @property
+    def mask(self):
+        return self.encode(getattr(self, field) for field in self.FIELDS)
+
+    @staticmethod
+    def cache_is_shared():
+        """
+        Whether invalidating a mask here reaches other processes; the
+        in-memory cache keeps one copy per process, so the worker would
+        hold on to masks a web process already dropped
+        """
+        return not isinstance(caches['default'], LocMemCache)
+
+    @classmethod
+    def masks_for(cls, user_ids):
+        """
+        user ID -> preference mask, from the cache where possible and one
+        query for the rest. Without a shared cache every mask is queried.
+        """
+        user_ids = set(user_ids)
+        use_cache = cls.cache_is_shared()
+        masks = {}
+        if use_cache:
+            cached = cache.get_many([cls.cache_key(user_id) for user_id in user_ids])
+            for user_id in user_ids:
+                mask = cached.get(cls.cache_key(user_id))
+                if mask is not None:
+                    masks[user_id] = mask
+        missing = user_ids - masks.keys()
+        if not missing:
+            return masks
+
+        loaded = dict.fromkeys(missing, cls.DEFAULT_MASK)
+        for user_id, *values in cls.objects.filter(
+            user_id__in=missing
+        ).values_list('user_id', *cls.FIELDS):
+            loaded[user_id] = cls.encode(values)
+        if use_cache:
+            cache.set_many(
+                {cls.cache_key(user_id): mask for user_id, mask in loaded.items()},
+                getattr(settings, 'NOTIFICATION_PREFERENCE_CACHE_TTL', 3600)
+            )
+        return {**masks, **loaded}
+
+    @classmethod
+    def invalidate(cls, user_id):
+        # After commit, so a reader can't cache the old row again
+        transaction.on_commit(lambda: cache.delete(cls.cache_key(user_id)))
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.invalidate(self.user_id)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.invalidate(self.user_id)
+        return result
+
+
+@receiver(post_save, sender=User)
+def forget_new_user_preferences(sender, instance, created, **kwargs):
+    """Never serve preferences cached for a previous owner of a reused ID"""
+    if created:
+        cache.delete(NotificationPreference.cache_key(instance.id))
+
+
+class NotificationJob(models.Model):
+    """
+    A notification-worthy event waiting to be fanned out.
+
+    Written in the same transaction as the action that caused it, and
+    turned into Notification rows by the notification worker
+    (manage.py run_notification_worker).
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    notification_type = models.CharField(
+        max_length=20,
+        choices=NotificationType.choices
+    )
+    actor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+
+    # What the event is about (the like's post, the new comment, ...)
+    content_type = models.ForeignKey(
+        ContentType,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True
+    )
+    object_id = models.PositiveIntegerField(null=True, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f"{self.notification_type} job {self.pk} ({self.status})"
+
+
+class NotificationArchive(models.Model):
+    """
+    Read notifications moved out of the hot table by the retention pruner
+    (manage.py prune_notifications), kept without titles or extra data
+    """
+
+    # The ID the row had in the notifications table
+    id = models.PositiveIntegerField(primary_key=True)
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    sender = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        null=True,
+        blank=True
+    )
+    notification_type = models.CharField(
+        max_length=20,
+        choices=NotificationType.choices
+    )
+    message = models.TextField()
+    content_type = models.ForeignKey(
+        ContentType,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True
+    )
+    object_id = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"Archived {self.notification_type} for user {self.recipient_id}"
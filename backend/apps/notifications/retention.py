@@ -0,0 +1,168 @@
+"""
+Notification retention.
+
+NOTIFICATION_RETENTION_DAYS gives how long each notification type stays
+in the notifications table, with a 'default' for the types it doesn't
+list and None meaning forever. The pruner (manage.py prune_notifications)
+deletes expired rows in small batches, each its own transaction that
+skips rows other writers hold, so it never holds long locks. With
+NOTIFICATION_ARCHIVE_ENABLED, expired notifications the recipient has
+read are copied to NotificationArchive first; unread ones are dropped.
+Badge counters are moved in the same transaction as each batch.
+Tombstones of deleted notifications are kept NOTIFICATION_TOMBSTONE_DAYS,
+as long as a sync cursor stays valid.
+"""
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import (
+    Notification,
+    NotificationArchive,
+    NotificationCounter,
+    NotificationTombstone
+)
+
+DEFAULT_RETENTION_DAYS = 90
+
+
+def retention_days():
+    """notification type -> days to keep, plus 'default'"""
+    policy = {'default': DEFAULT_RETENTION_DAYS}
+    policy.update(getattr(settings, 'NOTIFICATION_RETENTION_DAYS', {}))
+    return policy
+
+
+def archive_enabled():
+    return getattr(settings, 'NOTIFICATION_ARCHIVE_ENABLED', False)
+
+
+def expired_filter(now=None):
+    """Q matching notifications past their type's TTL, or None if none can be"""
+    now = now or timezone.now()
+    policy = retention_days()
+    default = policy.pop('default')
+
+    conditions = [
+        Q(notification_type=notification_type, created_at__lt=now - timedelta(days=days))
+        for notification_type, days in policy.items()
+        if days is not None
+    ]
+    if default is not None:
+        conditions.append(
+            Q(created_at__lt=now - timedelta(days=default))
+            & ~Q(notification_type__in=list(policy))
+        )
+    if not conditions:
+        return None
+
+    expired = conditions[0]
+    for condition in conditions[1:]:
+        expired |= condition
+    return expired
+
+
+def prune_batch(expired, batch_size, archive):
+    """
+    Delete up to batch_size expired notifications, archiving the read ones
+    if asked. Returns (deleted, archived).
+    """
+    from .consumers import publish_counts
+
+    with transaction.atomic():
+        notifications = list(
+            Notification.objects.select_for_update(skip_locked=True).filter(
+                expired
+            ).order_by('id').only(
+                'id', 'recipient_id', 'sender_id', 'notification_type', 'message',
+                'content_type_id', 'object_id', 'is_read', 'is_seen', 'created_at'
+            )[:batch_size]
+        )
+        if not notifications:
+            return 0, 0
+
+        watermarks = NotificationCounter.watermarks_for(
+            {notification.recipient_id for notification in notifications}
+        )
+        deltas = {}
+        archived = []
+        for notification in notifications:
+            is_read, is_seen = notification.effective_flags(
+                notification.is_read,
+                notification.is_seen,
+                watermarks[notification.recipient_id]
+            )
+            total, unread, unseen = deltas.get(notification.recipient_id, (0, 0, 0))
+            deltas[notification.recipient_id] = (
+                total - 1, unread - int(not is_read), unseen - int(not is_seen)
+            )
+            if archive and is_read:
+                archived.append(NotificationArchive(
+                    id=notification.id,
+                    recipient_id=notification.recipient_id,
+                    sender_id=notification.sender_id,
+                    notification_type=notification.notification_type,
+                    message=notification.message,
+                    content_type_id=notification.content_type_id,
+                    object_id=notification.object_id,
+                    created_at=notification.created_at
+                ))
+
+        NotificationArchive.objects.bulk_create(archived, ignore_conflicts=True)
+        Notification.objects.filter(
+            id__in=[notification.id for notification in notifications]
+        ).delete()
+        for user_id, (total, unread, unseen) in deltas.items():
+            NotificationCounter.adjust(user_id, total=total, unread=unread, unseen=unseen)
+
+        # Only badges that actually dropped need a push
+        changed = [user_id for user_id, (_, unread, unseen) in deltas.items() if unread or unseen]
+        transaction.on_commit(lambda: [publish_counts(user_id) for user_id in changed])
+
+    return len(notifications), len(archived)
+
+
+def prune(batch_size=None, archive=None, pause=0):
+    """
+    Delete every expired notification, one batch at a time, sleeping pause
+    seconds between batches. Returns (deleted, archived).
+    """
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_PRUNE_BATCH_SIZE', 1000)
+    archive = archive_enabled() if archive is None else archive
+    expired = expired_filter()
+    if expired is None:
+        return 0, 0
+
+    deleted = archived = 0
+    while True:
+        batch_deleted, batch_archived = prune_batch(expired, batch_size, archive)
+        deleted += batch_deleted
+        archived += batch_archived
+        if batch_deleted < batch_size:
+            return deleted, archived
+        if pause:
+            time.sleep(pause)
+
+
+def prune_tombstones(batch_size=None, pause=0):
+    """Delete tombstones no valid sync cursor can still need"""
+    from .sync import tombstone_days
+
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_PRUNE_BATCH_SIZE', 1000)
+    cutoff = timezone.now() - timedelta(days=tombstone_days())
+    deleted = 0
+    while True:
+        ids = list(NotificationTombstone.objects.filter(
+            deleted_at__lt=cutoff
+        ).order_by('id').values_list('id', flat=True)[:batch_size])
+        if ids:
+            deleted += NotificationTombstone.objects.filter(id__in=ids).delete()[0]
+        if len(ids) < batch_size:
+            return deleted
+        if pause:
+            time.sleep(pause)
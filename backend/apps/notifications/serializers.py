@@ -2,10 +2,10 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 
-from .models import Notification, NotificationPreference
+from .models import Notification, NotificationCounter, NotificationPreference
 from apps.users.serializers import UserListSerializer
 
-class NotificationSerializer(serializers.Serializer):
+class NotificationSerializer(serializers.ModelSerializer):
     """Serializer for notifications"""
     sender = UserListSerializer(read_only=True)
     recipient = UserListSerializer(read_only=True)
@@ -26,6 +26,17 @@ class NotificationSerializer(serializers.Serializer):
         from django.utils.timesince import timesince
         return timesince(obj.created_at)
 
+    def to_representation(self, instance):
+        """Report flags with the recipient's mark-all watermarks applied"""
+        data = super().to_representation(instance)
+        watermarks = self.context.setdefault('notification_watermarks', {})
+        if instance.recipient_id not in watermarks:
+            watermarks.update(NotificationCounter.watermarks_for([instance.recipient_id]))
+        data['is_read'], data['is_seen'] = instance.effective_flags(
+            instance.is_read, instance.is_seen, watermarks[instance.recipient_id]
+        )
+        return data
+
 
 class NotificationCreateSerializer(serializers.ModelSerializer):
     class Meta:
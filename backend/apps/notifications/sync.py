@@ -0,0 +1,118 @@
+"""
+Incremental notification sync.
+
+A client keeps an opaque cursor and asks for what changed since it:
+notifications created or updated after it (in (updated_at, id) order),
+the IDs of notifications deleted after it (from NotificationTombstone),
+the current counts and mark-all watermarks, and a new cursor. Without a
+cursor the response is empty and just positions the client at "now",
+so it fetches a cursor first and then the first page of the list.
+
+Cursors issued longer ago than NOTIFICATION_TOMBSTONE_DAYS may have
+missed deletes whose tombstones were pruned, so they are refused with
+410 and the client starts over. A row written by a transaction that commits after a
+later-stamped row was already synced can be skipped; notifications are
+small enough that the next full reload picks it up.
+"""
+
+import base64
+import binascii
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Notification, NotificationCounter, NotificationTombstone
+from .serializers import NotificationSerializer
+
+
+def tombstone_days():
+    return getattr(settings, 'NOTIFICATION_TOMBSTONE_DAYS', 30)
+
+
+def encode_cursor(notifications_after, deleted_after, issued_at):
+    positions = {
+        't': issued_at.isoformat(),
+        'n': [notifications_after[0].isoformat(), notifications_after[1]],
+        'd': [deleted_after[0].isoformat(), deleted_after[1]],
+    }
+    return base64.urlsafe_b64encode(json.dumps(positions).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    ((updated_at, id), (deleted_at, id), issued_at), or None if malformed
+    """
+    try:
+        positions = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        notifications_after, deleted_after = (
+            (parse_datetime(positions[key][0]), int(positions[key][1]))
+            for key in ('n', 'd')
+        )
+        issued_at = parse_datetime(positions['t'])
+    except (ValueError, KeyError, TypeError, IndexError, binascii.Error):
+        return None
+    moments = (notifications_after[0], deleted_after[0], issued_at)
+    if any(moment is None or moment.tzinfo is None for moment in moments):
+        return None
+    return notifications_after, deleted_after, issued_at
+
+
+def after(field, position):
+    """Keyset filter for rows strictly after (timestamp, id)"""
+    moment, last_id = position
+    return Q(**{f'{field}__gt': moment}) | Q(**{field: moment, 'id__gt': last_id})
+
+
+def changes_since(user_id, cursor, limit=None):
+    """
+    (status, data) for a sync request; data is the response body, which
+    has an 'error' key unless status is 200
+    """
+    limit = limit or getattr(settings, 'NOTIFICATION_SYNC_PAGE_SIZE', 100)
+    watermarks = NotificationCounter.watermarks_for([user_id])
+    now = timezone.now()
+
+    if cursor is None:
+        notifications, deleted = [], []
+        notifications_after = deleted_after = (now, 0)
+        has_more = False
+    else:
+        positions = decode_cursor(cursor)
+        if positions is None:
+            return 400, {'error': 'Invalid cursor'}
+        notifications_after, deleted_after, issued_at = positions
+        if issued_at < now - timedelta(days=tombstone_days()):
+            return 410, {'error': 'Cursor expired, reload notifications'}
+
+        notifications = list(Notification.objects.filter(
+            after('updated_at', notifications_after), recipient_id=user_id
+        ).select_related('sender', 'recipient', 'content_type').order_by(
+            'updated_at', 'id'
+        )[:limit + 1])
+        tombstones = list(NotificationTombstone.objects.filter(
+            after('deleted_at', deleted_after), recipient_id=user_id
+        ).order_by('deleted_at', 'id')[:limit + 1])
+
+        has_more = len(notifications) > limit or len(tombstones) > limit
+        notifications, tombstones = notifications[:limit], tombstones[:limit]
+        if notifications:
+            notifications_after = (notifications[-1].updated_at, notifications[-1].id)
+        if tombstones:
+            deleted_after = (tombstones[-1].deleted_at, tombstones[-1].id)
+        deleted = [tombstone.notification_id for tombstone in tombstones]
+
+    last_read_at, last_seen_at = watermarks[user_id]
+    return 200, {
+        'notifications': NotificationSerializer(
+            notifications, many=True, context={'notification_watermarks': watermarks}
+        ).data,
+        'deleted': deleted,
+        'counts': Notification.counts_for(user_id),
+        'watermarks': {'last_read_at': last_read_at, 'last_seen_at': last_seen_at},
+        'cursor': encode_cursor(notifications_after, deleted_after, now),
+        'has_more': has_more,
+    }
@@ -0,0 +1,510 @@
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import fanout
+from .fanout import process_pending_jobs
+from .models import (
+    Notification,
+    NotificationArchive,
+    NotificationCounter,
+    NotificationJob,
+    NotificationPreference,
+    NotificationTombstone,
+    NotificationType
+)
+from apps.posts.models import Post
+
+User = get_user_model()
+
+class NotificationTestCase(TestCase):
+    """Test for notifications app"""
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.sender = User.objects.create_user(
+            username='sender',
+            email='sender@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def notify(self, **kwargs):
+        kwargs.setdefault('notification_type', NotificationType.POST_LIKE)
+        return Notification.objects.create(
+            recipient=self.user,
+            sender=self.sender,
+            title='New like',
+            message='sender liked your post',
+            **kwargs
+        )
+
+    def test_list_notifications(self):
+        """Test listing the current user's notifications"""
+        self.notify()
+        response = self.client.get('/api/notifications/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['title'], 'New like')
+
+    def test_notification_counts(self):
+        """Test counts come back from one aggregate query"""
+        self.notify()
+        self.notify(is_read=True)
+        self.notify(is_read=True, is_seen=True)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/notifications/counts/')
+        self.assertEqual(response.data, {
+            'total_count': 3,
+            'unread_count': 1,
+            'unseen_count': 2,
+        })
+
+    async def test_notification_stream(self):
+        """Test new notifications and counts are pushed to the recipient"""
+        from config.asgi import application
+
+        token = await sync_to_async(AccessToken.for_user)(self.user)
+        communicator = ApplicationCommunicator(application, {
+            'type': 'http',
+            'method': 'GET',
+            'path': '/api/notifications/stream/',
+            'query_string': f'token={token}'.encode(),
+            'headers': [],
+        })
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        self.assertEqual((await communicator.receive_output())['status'], 200)
+        await communicator.receive_output()  # connected
+
+        opening = (await communicator.receive_output())['body'].decode()
+        self.assertTrue(opening.startswith('event: counts.updated\n'))
+        self.assertIn('"unread_count": 0', opening)
+
+        def notify():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.notify()
+
+        await sync_to_async(notify)()
+        event = (await communicator.receive_output())['body'].decode()
+        self.assertTrue(event.startswith('event: notification.created\n'))
+        self.assertIn('"unread_count": 1', event)
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait()
+
+    async def test_notification_socket(self):
+        """Test the WebSocket delivers the same events"""
+        from config.asgi import application
+
+        token = await sync_to_async(AccessToken.for_user)(self.user)
+        communicator = ApplicationCommunicator(application, {
+            'type': 'websocket',
+            'path': '/ws/notifications/',
+            'query_string': f'token={token}'.encode(),
+            'headers': [],
+            'subprotocols': [],
+        })
+        await communicator.send_input({'type': 'websocket.connect'})
+        self.assertEqual((await communicator.receive_output())['type'], 'websocket.accept')
+        opening = await communicator.receive_output()
+        self.assertIn('"event": "counts.updated"', opening['text'])
+
+        def read_all():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.notify()
+                self.client.post('/api/notifications/mark-all-read/')
+
+        await sync_to_async(read_all)()
+        frames = [(await communicator.receive_output())['text'] for _ in range(2)]
+        self.assertIn('"event": "notification.created"', frames[0])
+        self.assertIn('"event": "counts.updated"', frames[-1])
+        self.assertIn('"unread_count": 0', frames[-1])
+
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait()
+
+    def test_like_notification_is_queued(self):
+        """Test likes only enqueue a job and the worker creates the notification"""
+        post = Post.objects.create(author=self.user, content='Test post')
+        self.client.force_authenticate(user=self.sender)
+        self.client.post(f'/api/like/post/{post.id}/')
+
+        self.assertEqual(NotificationJob.objects.count(), 1)
+        self.assertFalse(Notification.objects.exists())
+
+        self.assertEqual(process_pending_jobs(), 1)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.recipient, self.user)
+        self.assertEqual(notification.sender, self.sender)
+        self.assertEqual(notification.notification_type, NotificationType.POST_LIKE)
+        self.assertEqual(notification.object_id, post.id)
+        self.assertFalse(NotificationJob.objects.exists())
+
+    def test_notifications_follow_preferences(self):
+        """Test the worker drops notifications the recipient turned off"""
+        NotificationPreference.objects.create(user=self.user, inapp_comments=False)
+        post = Post.objects.create(author=self.user, content='Test post')
+        self.client.force_authenticate(user=self.sender)
+        self.client.post(f'/api/posts/{post.id}/comments/', {'content': 'Hi'})
+        self.client.post(f'/api/like/post/{post.id}/')
+
+        self.assertEqual(process_pending_jobs(), 2)
+        self.assertEqual(
+            list(Notification.objects.values_list('notification_type', flat=True)),
+            [NotificationType.POST_LIKE]
+        )
+
+    def test_own_actions_are_not_notified(self):
+        """Test liking your own post doesn't notify you"""
+        post = Post.objects.create(author=self.user, content='Test post')
+        self.client.post(f'/api/like/post/{post.id}/')
+
+        process_pending_jobs()
+        self.assertFalse(Notification.objects.exists())
+
+    def test_friend_request_notifications(self):
+        """Test sending and accepting a request notify the other side"""
+        self.client.force_authenticate(user=self.sender)
+        self.client.post('/api/friends/send_request/', {'user_id': self.user.id})
+        process_pending_jobs()
+        request = Notification.objects.get(recipient=self.user)
+        self.assertEqual(request.notification_type, NotificationType.FRIEND_REQUEST)
+
+        self.client.force_authenticate(user=self.user)
+        self.client.post(f'/api/friends/{request.object_id}/respond/', {'action': 'accept'})
+        process_pending_jobs()
+        accept = Notification.objects.get(recipient=self.sender)
+        self.assertEqual(accept.notification_type, NotificationType.FRIEND_ACCEPT)
+
+    def test_likes_coalesce_into_one_notification(self):
+        """Test likes on one post fold into a single grouped notification"""
+        post = Post.objects.create(author=self.user, content='Test post')
+        likers = [self.sender] + [
+            User.objects.create_user(
+                username=f'liker{i}', email=f'liker{i}@example.com', password='testpass123'
+            )
+            for i in range(3)
+        ]
+        for liker in likers[:2]:
+            self.client.force_authenticate(user=liker)
+            self.client.post(f'/api/like/post/{post.id}/')
+        process_pending_jobs()
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.message, 'liker0 and sender reacted to your post')
+        notification.mark_as_read()
+
+        for liker in likers[2:]:
+            self.client.force_authenticate(user=liker)
+            self.client.post(f'/api/like/post/{post.id}/')
+        process_pending_jobs()
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.extra_data['actor_count'], 4)
+        self.assertEqual(
+            [actor['username'] for actor in notification.extra_data['actors']],
+            ['liker2', 'liker1', 'liker0']
+        )
+        self.assertEqual(notification.message, 'liker2 and 3 others reacted to your post')
+        self.assertFalse(notification.is_read)
+
+        # An actor no longer among the recent three reacting again is not new
+        self.client.force_authenticate(user=self.sender)
+        self.client.post(f'/api/like/post/{post.id}/')  # unlike
+        self.client.post(f'/api/like/post/{post.id}/')
+        process_pending_jobs()
+        notification = Notification.objects.get()
+        self.assertEqual(notification.extra_data['actor_count'], 4)
+        self.assertEqual(notification.message, 'liker2 and 3 others reacted to your post')
+
+        # Outside the window a new group starts
+        Notification.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.client.force_authenticate(user=self.sender)
+        self.client.post(f'/api/like/post/{post.id}/')  # unlike
+        self.client.post(f'/api/like/post/{post.id}/')
+        process_pending_jobs()
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_counters_follow_changes(self):
+        """Test the counter row tracks creates, reads, deletes and the fan-out"""
+        first = self.notify()
+        second = self.notify()
+        first.mark_as_read()
+        first.mark_as_read()
+        second.mark_as_seen()
+        self.assertEqual(Notification.counts_for(self.user.id), {
+            'total_count': 2, 'unread_count': 1, 'unseen_count': 1
+        })
+
+        self.client.post('/api/notifications/mark-all-seen/')
+        self.client.delete(f'/api/notifications/{second.id}/')
+        self.assertEqual(Notification.counts_for(self.user.id), {
+            'total_count': 1, 'unread_count': 0, 'unseen_count': 0
+        })
+
+        post = Post.objects.create(author=self.user, content='Test post')
+        self.client.force_authenticate(user=self.sender)
+        self.client.post(f'/api/like/post/{post.id}/')
+        process_pending_jobs()
+        counts = Notification.counts_for(self.user.id)
+        watermarks = NotificationCounter.watermarks_for([self.user.id])[self.user.id]
+        self.assertEqual(counts, Notification.aggregate_counts(self.user.id, *watermarks))
+        self.assertEqual(counts['unread_count'], 1)
+
+    def test_counter_rebuilt_when_missing(self):
+        """Test counts fall back to one aggregate when no counter row exists"""
+        self.notify()
+        NotificationCounter.objects.all().delete()
+
+        self.assertEqual(Notification.counts_for(self.user.id)['unread_count'], 1)
+        self.assertTrue(NotificationCounter.objects.filter(user=self.user).exists())
+
+    def test_mark_all_read_moves_watermark(self):
+        """Test mark-all writes one watermark instead of every row"""
+        old = self.notify()
+        self.notify()
+
+        response = self.client.post('/api/notifications/mark-all-read/')
+        self.assertEqual(response.data['updated_count'], 2)
+        self.assertFalse(Notification.objects.filter(is_read=True).exists())
+        self.assertIsNotNone(NotificationCounter.objects.get(user=self.user).last_read_at)
+
+        new = self.notify()
+        self.assertEqual(Notification.counts_for(self.user.id)['unread_count'], 1)
+        self.assertEqual(
+            Notification.counts_for(self.user.id),
+            NotificationCounter.rebuild(self.user.id)
+        )
+
+        response = self.client.get('/api/notifications/?is_read=false')
+        self.assertEqual([n['id'] for n in response.data['results']], [new.id])
+        response = self.client.get(f'/api/notifications/{old.id}/')
+        self.assertTrue(response.data['is_read'])
+
+        # Reading a row under the watermark changes nothing
+        old.mark_as_read()
+        self.assertEqual(Notification.counts_for(self.user.id)['unread_count'], 1)
+        new.mark_as_read()
+        self.assertEqual(Notification.counts_for(self.user.id)['unread_count'], 0)
+
+    def test_prune_expired_notifications(self):
+        """Test pruning deletes by type TTL in batches and archives read rows"""
+        read = self.notify()
+        unread = self.notify()
+        friend_request = self.notify(notification_type=NotificationType.FRIEND_REQUEST)
+        fresh = self.notify()
+        read.mark_as_read()
+        Notification.objects.exclude(id=fresh.id).update(
+            created_at=timezone.now() - timedelta(days=60)
+        )
+
+        with self.settings(NOTIFICATION_RETENTION_DAYS={'post_like': 30}):
+            call_command('prune_notifications', '--batch-size=1', '--archive', stdout=StringIO())
+
+        self.assertEqual(
+            set(Notification.objects.values_list('id', flat=True)),
+            {friend_request.id, fresh.id}
+        )
+        self.assertEqual(list(NotificationArchive.objects.values_list('id', flat=True)), [read.id])
+        self.assertFalse(Notification.objects.filter(id=unread.id).exists())
+        self.assertEqual(
+            Notification.counts_for(self.user.id),
+            Notification.aggregate_counts(self.user.id)
+        )
+
+    def test_preference_masks_are_cached(self):
+        """Test masks for many recipients come from one query, then the cache"""
+        # Any backend shared between processes; locmem isn't used for masks
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        shared_cache = self.settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': location,
+        }})
+        shared_cache.enable()
+        self.addCleanup(shared_cache.disable)
+
+        NotificationPreference.objects.create(user=self.user, inapp_post_likes=False)
+        user_ids = [self.user.id, self.sender.id]
+
+        with self.assertNumQueries(1):
+            masks = NotificationPreference.masks_for(user_ids)
+        with self.assertNumQueries(0):
+            self.assertEqual(NotificationPreference.masks_for(user_ids), masks)
+        self.assertFalse(NotificationPreference.allows(masks[self.user.id], 'inapp_post_likes'))
+        self.assertTrue(NotificationPreference.allows(masks[self.user.id], 'inapp_comments'))
+        self.assertEqual(masks[self.sender.id], NotificationPreference.DEFAULT_MASK)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch('/api/notifications/preferences/', {'inapp_post_likes': True})
+        mask = NotificationPreference.masks_for([self.user.id])[self.user.id]
+        self.assertTrue(NotificationPreference.allows(mask, 'inapp_post_likes'))
+
+    def test_worker_follows_preference_changes(self):
+        """Test the worker's next batch follows a preference changed elsewhere"""
+        post = Post.objects.create(author=self.user, content='Test post')
+        self.client.force_authenticate(user=self.sender)
+        self.client.post(f'/api/posts/{post.id}/comments/', {'content': 'First'})
+        process_pending_jobs()
+        first = Notification.objects.get()
+
+        # No on_commit callbacks run, as when the change commits in a web
+        # process and never invalidates the worker's copy
+        self.client.force_authenticate(user=self.user)
+        self.client.patch('/api/notifications/preferences/', {'inapp_comments': False})
+        self.client.force_authenticate(user=self.sender)
+        self.client.post(f'/api/posts/{post.id}/comments/', {'content': 'Second'})
+        process_pending_jobs()
+
+        # Resurfacing would have replaced the row
+        self.assertEqual(list(Notification.objects.values_list('id', flat=True)), [first.id])
+
+    def test_reading_preferences_does_not_create_them(self):
+        """Test GET returns the defaults without writing a row"""
+        response = self.client.get('/api/notifications/preferences/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['inapp_comments'])
+        self.assertFalse(NotificationPreference.objects.exists())
+
+    def test_sync_returns_changes_since_cursor(self):
+        """Test sync returns new, changed and deleted notifications once"""
+        old = self.notify()
+        cursor = self.client.get('/api/notifications/sync/').data['cursor']
+
+        new = self.notify()
+        old.mark_as_read()
+        response = self.client.get('/api/notifications/sync/', {'cursor': cursor})
+        self.assertEqual([n['id'] for n in response.data['notifications']], [new.id, old.id])
+        self.assertEqual(response.data['counts']['unread_count'], 1)
+        cursor = response.data['cursor']
+
+        self.client.delete(f'/api/notifications/{new.id}/')
+        self.assertTrue(NotificationTombstone.objects.filter(notification_id=new.id).exists())
+        response = self.client.get('/api/notifications/sync/', {'cursor': cursor})
+        self.assertEqual(response.data['notifications'], [])
+        self.assertEqual(response.data['deleted'], [new.id])
+
+        response = self.client.get('/api/notifications/sync/', {'cursor': response.data['cursor']})
+        self.assertEqual((response.data['notifications'], response.data['deleted']), ([], []))
+        response = self.client.get('/api/notifications/sync/', {'cursor': 'nope'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_sync_long_poll(self):
+        """Test a long-poll is answered as soon as a notification arrives"""
+        from config.asgi import application
+
+        token = await sync_to_async(AccessToken.for_user)(self.user)
+        cursor = (await sync_to_async(self.client.get)('/api/notifications/sync/')).data['cursor']
+
+        async def poll(wait):
+            communicator = ApplicationCommunicator(application, {
+                'type': 'http',
+                'method': 'GET',
+                'path': '/api/notifications/sync/',
+                'query_string': f'token={token}&cursor={cursor}&wait={wait}'.encode(),
+                'headers': [],
+            })
+            await communicator.send_input({'type': 'http.request', 'body': b''})
+            return communicator
+
+        communicator = await poll(0.1)
+        self.assertEqual((await communicator.receive_output())['status'], 200)
+        body = json.loads((await communicator.receive_output())['body'])
+        self.assertEqual(body['notifications'], [])
+
+        communicator = await poll(10)
+        self.assertTrue(await communicator.receive_nothing(timeout=0.2))
+
+        def notify():
+            with self.captureOnCommitCallbacks(execute=True):
+                return self.notify()
+
+        notification = await sync_to_async(notify)()
+        self.assertEqual((await communicator.receive_output(timeout=2))['status'], 200)
+        body = json.loads((await communicator.receive_output())['body'])
+        self.assertEqual([n['id'] for n in body['notifications']], [notification.id])
+
+    def test_worker_needs_shared_channel_layer(self):
+        """Test the worker refuses to run where its pushes can't reach clients"""
+        with self.assertRaises(CommandError):
+            call_command('run_notification_worker', '--once', stdout=StringIO())
+
+        stderr = StringIO()
+        call_command(
+            'run_notification_worker', '--once', '--without-push',
+            stdout=StringIO(), stderr=stderr
+        )
+        self.assertIn('not be pushed', stderr.getvalue())
+
+    def test_repeat_comments_resurface_group(self):
+        """Test another comment by someone already in the group is still news"""
+        post = Post.objects.create(author=self.user, content='Test post')
+        self.client.force_authenticate(user=self.sender)
+        self.client.post(f'/api/posts/{post.id}/comments/', {'content': 'First'})
+        process_pending_jobs()
+        first = Notification.objects.get()
+        first.mark_as_read()
+
+        response = self.client.post(f'/api/posts/{post.id}/comments/', {'content': 'Second'})
+        process_pending_jobs()
+
+        # Resurfacing replaces the row rather than moving its created_at
+        notification = Notification.objects.get()
+        self.assertNotEqual(notification.id, first.id)
+        self.assertTrue(NotificationTombstone.objects.filter(notification_id=first.id).exists())
+        self.assertFalse(notification.is_read)
+        self.assertEqual(notification.extra_data['actor_count'], 1)
+        self.assertEqual(notification.extra_data['comment_id'], response.data['id'])
+        self.assertEqual(Notification.counts_for(self.user.id)['unread_count'], 1)
+
+    def test_racing_workers_share_one_group(self):
+        """Test a batch that opens an already open group folds into it instead"""
+        post = Post.objects.create(author=self.user, content='Test post')
+        self.client.force_authenticate(user=self.sender)
+        self.client.post(f'/api/like/post/{post.id}/')
+        process_pending_jobs()
+
+        liker = User.objects.create_user(username='liker', password='testpass123')
+        self.client.force_authenticate(user=liker)
+        self.client.post(f'/api/like/post/{post.id}/')
+
+        coalesce = fanout.coalesce
+        calls = []
+
+        def racing_coalesce(notifications):
+            # The first pass misses the group, as if another worker opened
+            # it after this one looked
+            calls.append(notifications)
+            if len(calls) == 1:
+                for notification in notifications:
+                    notification.is_open_group = True
+                return notifications, []
+            return coalesce(notifications)
+
+        with mock.patch.object(fanout, 'coalesce', side_effect=racing_coalesce):
+            self.assertEqual(process_pending_jobs(), 1)
+
+        self.assertEqual(len(calls), 2)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.extra_data['actor_count'], 2)
+        self.assertFalse(NotificationJob.objects.exists())
+        self.assertEqual(Notification.counts_for(self.user.id)['total_count'], 1)
@@ -11,6 +11,7 @@ urlpatterns = [
     path('<int:pk>/seen/', views.mark_notification_seen, name='mark-seen'),
     path('mark-all-read/', views.mark_all_notifications_read, name='mark-all-read'),
     path('mark-all-seen/', views.mark_all_notifications_seen, name='mark-all-seen'),
+    path('sync/', views.sync_notifications, name='notification-sync'),
     path('counts/', views.notification_counts, name='notification-counts'),
     path('preferences/', views.NotificationPreferenceView.as_view(), name='notification-preferences'),
 ]
\ No newline at end of file
@@ -1,19 +1,21 @@
 from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from django.db.models import Q
-from django.utils import timezone
 
-from .models import Notification, NotificationPreference
+from config.pagination import KeysetPagination
+from .consumers import publish_counts
+from .models import Notification, NotificationCounter, NotificationPreference
+from .sync import changes_since
 from .serializers import (
     NotificationCreateSerializer, 
     NotificationSerializer,
     NotificationPreferenceSerializer
 )
 
-class NotificatonPagination(PageNumberPagination):
+class NotificationPagination(KeysetPagination):
     """Paginate notification"""
     page_size = 20
     page_size_query_param = 'page_size'
@@ -22,7 +24,7 @@ class NotificatonPagination(PageNumberPagination):
 class NotificationListView(generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = NotificatonPagination
+    pagination_class = NotificationPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -35,10 +37,14 @@ class NotificationListView(generics.ListAPIView):
         if notification_type:
             queryset = queryset.filter(notification_type=notification_type)
 
-        # Filter by read status
+        # Filter by read status, counting everything under the watermark as read
         is_read = self.request.query_params.get('is_read')
         if is_read is not None:
-            queryset = queryset.filter(is_read=is_read.lower() == 'true')
+            last_read_at, _ = NotificationCounter.watermarks_for([user.id])[user.id]
+            read = Q(is_read=True)
+            if last_read_at is not None:
+                read |= Q(created_at__lte=last_read_at)
+            queryset = queryset.filter(read if is_read.lower() == 'true' else ~read)
 
         return queryset
     
@@ -60,6 +66,14 @@ class NotificationDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     def get_queryset(self):
         return Notification.objects.filter(recipient=self.request.user)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        transaction.on_commit(lambda: publish_counts(self.request.user.id))
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        transaction.on_commit(lambda: publish_counts(self.request.user.id))
     
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -70,6 +84,7 @@ def mark_notification_read(request, pk):
         recipient=request.user
     )
     notification.mark_as_read()
+    transaction.on_commit(lambda: publish_counts(request.user.id))
     return Response({'status': 'notification marked as read'})
 
 
@@ -82,17 +97,17 @@ def mark_notification_seen(request, pk):
         recipient=request.user
     )
     notification.mark_as_seen()
+    transaction.on_commit(lambda: publish_counts(request.user.id))
     return Response({'status': 'notification marked as seen'})
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def mark_all_notifications_read(request):
-    updated_count = Notification.objects.filter(
-        recipient=request.user,
-        is_read=False
-    ).update(is_read=True, updated_at=timezone.now())
-    
+    updated_count = NotificationCounter.mark_all(request.user.id, 'read')
+    if updated_count:
+        transaction.on_commit(lambda: publish_counts(request.user.id))
+
     return Response({
         'status': 'all notifications marked as read',
         'updated_count': updated_count
@@ -102,11 +117,10 @@ def mark_all_notifications_read(request):
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def mark_all_notifications_seen(request):
-    updated_count = Notification.objects.filter(
-        recipient=request.user,
-        is_seen=False
-    ).update(is_seen=True, updated_at=timezone.now())
-    
+    updated_count = NotificationCounter.mark_all(request.user.id, 'seen')
+    if updated_count:
+        transaction.on_commit(lambda: publish_counts(request.user.id))
+
     return Response({
         'status': 'all notifications marked as seen',
         'updated_count': updated_count
@@ -116,22 +130,19 @@ def mark_all_notifications_seen(request):
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def notification_counts(request):
-    user = request.user
-    total_count = Notification.objects.filter(recipient=user).count()
-    unread_count = Notification.objects.filter(
-        recipient=user, 
-        is_read=False
-    ).count()
-    unseen_count = Notification.objects.filter(
-        recipient=user, 
-        is_seen=False
-    ).count()
-    
-    return Response({
-        'total_count': total_count,
-        'unread_count': unread_count,
-        'unseen_count': unseen_count
-    })
+    """Counts for the badge; live clients get them pushed over the stream"""
+    return Response(Notification.counts_for(request.user.id))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def sync_notifications(request):
+    """
+    Changes since ?cursor=. Long-polling with ?wait= is served by the ASGI
+    consumer on the same path; here the answer is always immediate.
+    """
+    status_code, data = changes_since(request.user.id, request.query_params.get('cursor'))
+    return Response(data, status=status_code)
 
 
 class NotificationPreferenceView(generics.RetrieveUpdateAPIView):
@@ -139,6 +150,10 @@ class NotificationPreferenceView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_object(self):
+        if self.request.method in permissions.SAFE_METHODS:
+            # Reads never write; without a row the defaults apply
+            preferences = NotificationPreference.objects.filter(user=self.request.user).first()
+            return preferences or NotificationPreference(user=self.request.user)
         preferences, created = NotificationPreference.objects.get_or_create(
             user=self.request.user
         )
@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from apps.posts.timeline import backfill_size, rebuild_timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized home timelines from posts and friendships"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Only rebuild this user ID (can be repeated)'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=backfill_size(),
+            help='Recent posts to copy in per author'
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True)
+        if options['user_ids']:
+            users = users.filter(id__in=options['user_ids'])
+
+        total = 0
+        for user in users.iterator():
+            rebuild_timeline(user, options['limit'])
+            total += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} timelines"))
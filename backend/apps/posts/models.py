@@ -42,6 +42,7 @@ class Post(models.Model):
 
     # Engagement counts
     likes_count = models.PositiveIntegerField(default=0)
+    reaction_counts = models.JSONField(default=dict, blank=True)  # {'love': 3, ...}
     comments_count = models.PositiveIntegerField(default=0)
 
     # Timestamps
@@ -62,6 +63,15 @@ class Post(models.Model):
     def __str__(self):
         content_preview = self.content[:50] + '...' if len(self.content) > 50 else self.content
         return f"{self.author.username}: {content_preview}"
+
+    def save(self, *args, **kwargs):
+        is_new = self.pk is None
+        super().save(*args, **kwargs)
+
+        # Push new posts into the author's and friends' home timelines
+        if is_new and not self.is_deleted:
+            from .timeline import fan_out_post
+            fan_out_post(self)
     
     
 class PostMedia(models.Model):
@@ -113,3 +123,35 @@ class PostTag(models.Model):
 
     def __str__(self):
         return f"{self.user.username} tagged in {self.post.id}"
+
+
+class TimelineEntry(models.Model):
+    """Materialized home timeline row: `post` shows up in `owner`'s feed"""
+
+    owner = models.ForeignKey(
+        User,
+        related_name='timeline_entries',
+        on_delete=models.CASCADE
+    )
+    post = models.ForeignKey(
+        Post,
+        related_name='timeline_entries',
+        on_delete=models.CASCADE
+    )
+    # Denormalized from the post so reads and unfriend cleanup never join posts
+    author = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('owner', 'post')
+        indexes = [
+            models.Index(fields=['owner', '-created_at']),
+            models.Index(fields=['owner', 'author']),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} in {self.owner_id}'s timeline"
@@ -1,9 +1,13 @@
 from rest_framework import serializers
 from .models import Post, PostMedia, PostTag
 from apps.users.serializers import UserListSerializer
-from apps.likes.models import Like
-from django.contrib.contenttypes.models import ContentType
+from apps.likes.loaders import ViewerReactionLoader
 from apps.comments.models import Comment
+from apps.likes.serializers import (
+    BufferedCountersMixin,
+    ViewerReactionMixin,
+    ViewerStateListSerializer
+)
 
 
 class PostMediaSerializer(serializers.ModelSerializer):
@@ -20,7 +24,7 @@ class PostTagSerializer(serializers.ModelSerializer):
         fields = ['user']
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(BufferedCountersMixin, ViewerReactionMixin, serializers.ModelSerializer):
     """Serializer for reading posts"""
     author = UserListSerializer(read_only=True)
     media = PostMediaSerializer(many=True, read_only=True)
@@ -37,46 +41,33 @@ class PostSerializer(serializers.ModelSerializer):
         model = Post
         fields = [
             'id', 'author', 'content', 'post_type', 'privacy',
-            'location', 'media', 'tags', 'likes_count', 
-            'comments_count', 'user_has_liked', 'user_reaction' 
+            'location', 'media', 'tags', 'likes_count', 'reaction_counts',
+            'comments_count', 'user_has_liked', 'user_reaction',
             'recent_comments','created_at', 'updated_at'
         ]
+        read_only_fields = ['likes_count', 'reaction_counts', 'comments_count']
+        list_serializer_class = ViewerStateListSerializer
 
 
+    def preload(self, instances):
+        """Load recent comments for the page, and the viewer's reactions to them"""
+        super().preload(instances)
+        recent = Comment.get_recent_for_posts([post.id for post in instances])
+        self.context.setdefault('recent_comments', {}).update(recent)
+        ViewerReactionLoader(self.context).prime(
+            [comment for comments in recent.values() for comment in comments]
+        )
+
     def get_recent_comments(self, obj):
         """Get first 3 comments"""
         from apps.comments.serializers import CommentSerializer
-        recent = obj.comments.filter(is_deleted=False)[:3]
+        recent = self.context.get('recent_comments', {}).get(obj.id)
+        if recent is None:
+            recent = obj.comments.filter(
+                is_deleted=False
+            ).select_related('author')[:3]
         return CommentSerializer(recent, many=True, context=self.context).data
 
-    def get_user_has_liked(self,obj):
-        """Check if current user has liked this post"""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            content_type = ContentType.objects.get_for_model(Post)
-            return Like.objects.filter(
-                user=request.user,
-                content_type=content_type,
-                object_id=obj.id
-            ).exists()
-        return False
-    
-    def get_user_reaction(self, obj):
-        """Get current user's reaction to this post"""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            content_type = ContentType.objects.get_for_model(Post)
-            try:
-                like = like.objects.get(
-                    user=request.user,
-                    content_type=content_type,
-                    object_id=obj.id
-                )
-                return like.reaction_type
-            except Like.DoesNotExist:
-                return None
-        return None
-        
 
 class CreatePostSerializer(serializers.ModelSerializer):
     """Serializer for creating posts"""
@@ -3,7 +3,15 @@ from rest_framework.test import APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
-from .models import Post, PostMedia
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.contrib.contenttypes.models import ContentType
+from .models import Post, PostMedia, TimelineEntry
+from apps.friendships.graph import friend_graph
+from apps.friendships.models import Friendship
+from apps.likes.models import Like
+from apps.comments.models import Comment
 
 User = get_user_model()
 
@@ -69,7 +77,216 @@ class PostTestCase(TestCase):
         response = self.client.get('/api/posts/timeline/')
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_timeline_includes_friends_posts(self):
+        """Test friends' posts are fanned out into the timeline"""
+        friend = User.objects.create_user(
+            username='friend', email='friend@example.com', password='pass'
+        )
+        stranger = User.objects.create_user(
+            username='stranger', email='stranger@example.com', password='pass'
+        )
+        Friendship.objects.create(
+            requester=self.user,
+            addressee=friend,
+            status='accepted'
+        )
+        Post.objects.create(author=friend, content='Friend post')
+        Post.objects.create(author=friend, content='Private post', privacy='private')
+        Post.objects.create(author=stranger, content='Stranger post', privacy='public')
+
+        response = self.client.get('/api/posts/timeline/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [post['content'] for post in response.data['results']],
+            ['Friend post']
+        )
+
+    def test_unfriend_removes_posts_from_timeline(self):
+        """Test unfriending cleans the timeline"""
+        friend = User.objects.create_user(
+            username='friend', email='friend@example.com', password='pass'
+        )
+        Friendship.objects.create(
+            requester=self.user,
+            addressee=friend,
+            status='accepted'
+        )
+        Post.objects.create(author=friend, content='Friend post')
+
+        self.client.delete(f'/api/friends/{friend.id}/unfriend/')
+
+        self.assertFalse(
+            TimelineEntry.objects.filter(owner=self.user, author=friend).exists()
+        )
+        response = self.client.get('/api/posts/timeline/')
+        self.assertEqual(len(response.data['results']), 0)
+
+    def test_fan_out_ignores_stale_graph_cache(self):
+        """Test a post never reaches an ex-friend the graph cache still lists"""
+        friend = User.objects.create_user(
+            username='friend', email='friend@example.com', password='pass'
+        )
+        Friendship.objects.create(
+            requester=self.user,
+            addressee=friend,
+            status='accepted'
+        )
+        friend_graph.prime([self.user.id, friend.id])
+        self.addCleanup(friend_graph.clear)
+        self.assertIn(friend.id, friend_graph.friends(self.user.id))
+
+        # As if another process handled the unfriend: the cache isn't told
+        Friendship.objects.all().delete()
+        Post.objects.create(author=self.user, content='Friends only', privacy='friends')
+
+        self.assertFalse(TimelineEntry.objects.filter(owner=friend).exists())
+        self.client.force_authenticate(user=friend)
+        response = self.client.get('/api/posts/timeline/')
+        self.assertEqual(response.data['results'], [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_timeline_pulls_high_degree_posts(self):
+        """Test posts by high-degree authors are pulled on read"""
+        friend = User.objects.create_user(
+            username='friend', email='friend@example.com', password='pass'
+        )
+        Friendship.objects.create(
+            requester=self.user,
+            addressee=friend,
+            status='accepted'
+        )
+        Post.objects.create(author=friend, content='Celebrity post')
+
+        # Not fanned out on write
+        self.assertFalse(
+            TimelineEntry.objects.filter(owner=self.user, author=friend).exists()
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/posts/timeline/')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['content'], 'Celebrity post')
+
+        # Merged at read time; reading writes nothing
+        self.assertFalse(any(
+            query['sql'].lstrip().upper().startswith('INSERT')
+            for query in queries.captured_queries
+        ))
+        self.assertFalse(
+            TimelineEntry.objects.filter(owner=self.user, author=friend).exists()
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_pulled_posts_paginate_with_timeline(self):
+        """Test pulled and fanned-out posts share one cursor without overlap"""
+        friend = User.objects.create_user(
+            username='friend', email='friend@example.com', password='pass'
+        )
+        Friendship.objects.create(
+            requester=self.user,
+            addressee=friend,
+            status='accepted'
+        )
+        for i in range(15):
+            Post.objects.create(author=self.user, content=f'Own {i}')
+            Post.objects.create(author=friend, content=f'Friend {i}')
+
+        response = self.client.get('/api/posts/timeline/')
+        next_page = self.client.get(response.data['next'])
+        self.assertIsNone(next_page.data['next'])
+
+        posts = response.data['results'] + next_page.data['results']
+        self.assertEqual(len({post['id'] for post in posts}), 30)
+        self.assertEqual(
+            [post['id'] for post in posts],
+            list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        )
+
+    def test_timeline_cursor_pagination(self):
+        """Test timeline pages follow the cursor without overlap"""
+        for i in range(25):
+            Post.objects.create(author=self.user, content=f'Post {i}')
+
+        response = self.client.get('/api/posts/timeline/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertNotIn('count', response.data)
+        self.assertIsNotNone(response.data['next'])
+
+        next_page = self.client.get(response.data['next'])
+        self.assertEqual(len(next_page.data['results']), 5)
+        self.assertIsNone(next_page.data['next'])
+
+        seen = [post['id'] for post in response.data['results'] + next_page.data['results']]
+        self.assertEqual(len(set(seen)), 25)
+
+    def test_invalid_cursor(self):
+        """Test a malformed cursor is rejected"""
+        response = self.client.get('/api/posts/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_viewer_reactions_loaded_per_page(self):
+        """Test the viewer's reactions for a page come from one Like query"""
+        posts = [
+            Post.objects.create(author=self.user, content=f'Post {i}')
+            for i in range(5)
+        ]
+        Like.objects.create(
+            user=self.user,
+            content_type=ContentType.objects.get_for_model(Post),
+            object_id=posts[2].id,
+            reaction_type='love'
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/posts/')
+
+        reactions = {
+            post['id']: (post['user_has_liked'], post['user_reaction'])
+            for post in response.data['results']
+        }
+        self.assertEqual(reactions[posts[2].id], (True, 'love'))
+        self.assertEqual(reactions[posts[0].id], (False, None))
+
+        like_queries = [
+            query for query in queries.captured_queries
+            if 'likes_like' in query['sql']
+        ]
+        self.assertEqual(len(like_queries), 1)
+
+    def test_recent_comments_prefetched_per_page(self):
+        """Test recent comments for a page load in one windowed query"""
+        posts = [
+            Post.objects.create(author=self.user, content=f'Post {i}')
+            for i in range(3)
+        ]
+        for post in posts:
+            for i in range(5):
+                Comment.objects.create(
+                    post=post, author=self.user, content=f'Comment {i}'
+                )
+        Comment.objects.create(
+            post=posts[0], author=self.user, content='Deleted', is_deleted=True
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/posts/')
+
+        for post in response.data['results']:
+            self.assertEqual(
+                [comment['content'] for comment in post['recent_comments']],
+                ['Comment 4', 'Comment 3', 'Comment 2']
+            )
+
+        comment_queries = [
+            query for query in queries.captured_queries
+            if 'ROW_NUMBER' in query['sql']
+        ]
+        self.assertEqual(len(comment_queries), 1)
+        self.assertIn('users', comment_queries[0]['sql'])
 
     def test_update_own_post(self):
         """Test updating own post"""
@@ -129,6 +346,6 @@ class PostTestCase(TestCase):
         response = self.client.get('/api/posts/my_posts/')
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
-        for post in response.data:
+        self.assertEqual(len(response.data['results']), 2)
+        for post in response.data['results']:
             self.assertEqual(post['author']['username'], self.user.username)
\ No newline at end of file
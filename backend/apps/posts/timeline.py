@@ -0,0 +1,156 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import F, Q
+
+from apps.friendships.graph import friend_graph
+from apps.friendships.models import Friendship
+from .models import Post, TimelineEntry
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+
+
+def fanout_limit():
+    """
+    Authors with more accepted friends than this are not fanned out on write,
+    their posts are pulled into readers' timelines when those readers load them
+    """
+    return getattr(settings, 'TIMELINE_FANOUT_LIMIT', 5000)
+
+
+def backfill_size():
+    """How many recent posts per author get copied in on backfill / pull"""
+    return getattr(settings, 'TIMELINE_BACKFILL_SIZE', 50)
+
+
+def _entry(owner_id, post):
+    return TimelineEntry(
+        owner_id=owner_id,
+        post_id=post.id,
+        author_id=post.author_id,
+        created_at=post.created_at,
+    )
+
+
+def _visible_posts(author_id):
+    """Recent posts by an author that friends are allowed to see"""
+    return Post.objects.filter(
+        author_id=author_id,
+        is_deleted=False,
+    ).exclude(privacy='private').order_by('-created_at')
+
+
+def friend_ids(user, among=None):
+    """
+    Accepted friends from the database. Timeline writes use this rather
+    than the graph cache, which can lag an unfriend handled by another
+    process; a post fanned out on stale adjacency would never be removed.
+    """
+    friendships = Friendship.objects.filter(
+        Q(requester_id=user.id) | Q(addressee_id=user.id),
+        status='accepted'
+    )
+    if among is not None:
+        friendships = friendships.filter(
+            Q(requester_id__in=among) | Q(addressee_id__in=among)
+        )
+    return [
+        addressee_id if requester_id == user.id else requester_id
+        for requester_id, addressee_id in friendships.values_list('requester_id', 'addressee_id')
+    ]
+
+
+def is_high_degree(user):
+    return friend_graph.degree(user.id) > fanout_limit()
+
+
+def fan_out_post(post):
+    """Write a new post into its author's timeline and their friends' timelines"""
+    owner_ids = [post.author_id]
+    if post.privacy != 'private' and not is_high_degree(post.author):
+        owner_ids += friend_ids(post.author)
+
+    TimelineEntry.objects.bulk_create(
+        [_entry(owner_id, post) for owner_id in owner_ids],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def backfill_timeline(owner, author, limit=None):
+    """Copy an author's most recent posts into owner's timeline"""
+    limit = limit or backfill_size()
+    if owner.id == author.id:
+        posts = Post.objects.filter(author=author, is_deleted=False)[:limit]
+    else:
+        posts = _visible_posts(author.id)[:limit]
+
+    TimelineEntry.objects.bulk_create(
+        [_entry(owner.id, post) for post in posts],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def remove_from_timeline(owner, author):
+    """Drop every post by author from owner's timeline"""
+    TimelineEntry.objects.filter(owner=owner, author=author).delete()
+
+
+def link_friends(user1, user2):
+    """Backfill both timelines after a friendship is accepted"""
+    backfill_timeline(user1, user2)
+    backfill_timeline(user2, user1)
+
+
+def unlink_friends(user1, user2):
+    """Clean up both timelines after an unfriend or block"""
+    remove_from_timeline(user1, user2)
+    remove_from_timeline(user2, user1)
+
+
+def rebuild_timeline(user, limit=None):
+    """Rebuild a user's timeline from scratch (own posts plus friends' posts)"""
+    limit = limit or backfill_size()
+    TimelineEntry.objects.filter(owner=user).delete()
+    backfill_timeline(user, user, limit)
+    for friend in User.objects.filter(id__in=friend_ids(user)):
+        backfill_timeline(user, friend, limit)
+
+
+def pull_high_degree_posts(user):
+    """
+    Posts by high-degree friends, which were not fanned out on write and
+    are merged into the timeline page at read time; None if there are none
+    """
+    ids = list(friend_graph.friends(user.id))
+    if not ids:
+        return None
+
+    # Degrees come from the graph cache, loading any misses in one query
+    friend_graph.prime(ids)
+    high_degree_ids = [uid for uid in ids if friend_graph.degree(uid) > fanout_limit()]
+    if not high_degree_ids:
+        return None
+    # The cache is only a hint; confirm the few candidates are still friends
+    high_degree_ids = friend_ids(user, among=high_degree_ids)
+    if not high_degree_ids:
+        return None
+
+    # Shaped like timeline entries so both page on (created_at, post_id)
+    return Post.objects.filter(
+        author_id__in=high_degree_ids,
+        is_deleted=False,
+    ).exclude(privacy='private').annotate(post_id=F('id'))
+
+
+def get_timeline(user):
+    """Return the user's timeline entries, newest first"""
+    return TimelineEntry.objects.filter(
+        owner=user,
+        post__is_deleted=False,
+    ).filter(
+        # Posts made private after fan-out are only visible to their author
+        Q(author=user) | ~Q(post__privacy='private')
+    ).order_by('-created_at', '-post_id')
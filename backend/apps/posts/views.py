@@ -3,11 +3,43 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
 
 
 from .models import Post
 from .serializers import PostSerializer, CreatePostSerializer, UpdatePostSerializer
+from .timeline import get_timeline, pull_high_degree_posts
+from config.pagination import KeysetPagination
+
+
+class TimelinePagination(KeysetPagination):
+    """Paginate timeline entries on the (owner, -created_at) index"""
+    ordering = ('-created_at', '-post_id')
+
+    def paginate_timeline(self, entries, pulled, request, view=None):
+        """
+        One page of timeline entries merged with posts pulled at read time.
+        The top of the merged feed is within the top page of each source,
+        so each is read with the same cursor and LIMIT.
+        """
+        page = self.paginate_queryset(entries, request, view=view)
+        if page is None or pulled is None:
+            return page
+
+        pulled = pulled.order_by(*self.ordering)
+        position = self.decode_cursor(request, entries.model)
+        if position is not None:
+            pulled = pulled.filter(self.get_position_filter(position))
+
+        rows = {post.post_id: post for post in pulled[:self.page_size + 1]}
+        # A post can be both fanned out and pulled; keep it once
+        rows.update((entry.post_id, entry) for entry in page)
+        rows = sorted(
+            rows.values(), key=lambda row: (row.created_at, row.post_id), reverse=True
+        )
+        self.has_next = self.has_next or len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
 
 class PostViewSet(viewsets.ModelViewSet):
     """ViewSet for managing posts"""
@@ -66,20 +98,30 @@ class PostViewSet(viewsets.ModelViewSet):
     def my_posts(self, request):
         """Get current user's posts"""
         posts = self.get_queryset().filter(author=request.user)
-        serializer = self.get_serializer(posts, many=True)
-        return Response(serializer.data)
+
+        page = self.paginate_queryset(posts)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def timeline(self, request):
         """Get posts for user timeline"""
-        # For now, show all public posts and user's own posts
-        # Later we'll implement friend-based filtering
-        posts = self.get_queryset().filter(
-            Q(privacy='public') | Q(author=request.user)
-        )[:20] # Limit to 20 posts
+        # Own posts and friends' posts from the materialized timeline, plus
+        # high-degree friends' posts pulled at read time
+        paginator = TimelinePagination()
+        entries = paginator.paginate_timeline(
+            get_timeline(request.user),
+            pull_high_degree_posts(request.user),
+            request,
+            view=self
+        )
+        posts = self.get_queryset().in_bulk([entry.post_id for entry in entries])
 
-        serializer = self.get_serializer(posts, many=True)
-        return Response(serializer.data)
+        serializer = self.get_serializer(
+            [posts[entry.post_id] for entry in entries if entry.post_id in posts],
+            many=True
+        )
+        return paginator.get_paginated_response(serializer.data)
     
     @action(detail=True, methods=['get'])
     def detail(self, request, pk=None):
@@ -0,0 +1,39 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Sets scope['user'] for ASGI consumers from a JWT access token.
+
+    Browsers can't set headers on EventSource or WebSocket connections, so
+    the token may also be passed as ?token=<access token>.
+    """
+
+    def get_raw_token(self, scope):
+        for name, value in scope.get('headers', []):
+            if name == b'authorization':
+                parts = value.decode().split()
+                if len(parts) == 2 and parts[0] == 'Bearer':
+                    return parts[1]
+        query = parse_qs(scope.get('query_string', b'').decode())
+        return query.get('token', [None])[0]
+
+    @database_sync_to_async
+    def get_user(self, raw_token):
+        authentication = JWTAuthentication()
+        try:
+            return authentication.get_user(authentication.get_validated_token(raw_token))
+        except (AuthenticationFailed, TokenError):
+            return AnonymousUser()
+
+    async def __call__(self, scope, receive, send):
+        raw_token = self.get_raw_token(scope)
+        scope = dict(scope, user=await self.get_user(raw_token) if raw_token else AnonymousUser())
+        return await super().__call__(scope, receive, send)
@@ -47,7 +47,7 @@ class User(AbstractUser):
     # Account Status
     is_online = models.BooleanField(default=False)
     is_verified = models.BooleanField(default=False)
-    last_seen = models.DateTimeField(default=timezone.now())
+    last_seen = models.DateTimeField(default=timezone.now)
 
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,192 @@
+"""
+Buffered presence tracking.
+
+Clients post a heartbeat every so often while they're open. Heartbeats
+only touch an in-memory map of user ID -> last heartbeat; a user counts
+as online until PRESENCE_TTL_SECONDS pass without one. A background
+thread writes the coalesced is_online / last_seen changes to the users
+table every PRESENCE_FLUSH_INTERVAL_SECONDS, one batched UPDATE however
+many heartbeats arrived. Other processes see a user through those
+columns, so a user heartbeating elsewhere is found with one query over
+the IDs this process doesn't have as online.
+
+With several workers, each only sees the heartbeats routed to it, so
+writes never trust local state alone: last_seen only ever moves forward,
+and a user whose heartbeats stopped here is only marked offline if the
+stored last_seen is past the TTL too. That holds as long as the heartbeat
+interval plus PRESENCE_FLUSH_INTERVAL_SECONDS stays under the TTL.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Pending changes: a heartbeat, a logout, or heartbeats that stopped here
+ONLINE, OFFLINE, EXPIRED = 'online', 'offline', 'expired'
+
+
+def presence_ttl():
+    return timedelta(seconds=getattr(settings, 'PRESENCE_TTL_SECONDS', 60))
+
+
+def flush_interval():
+    """Seconds between flushes; 0 disables the background flusher"""
+    return getattr(settings, 'PRESENCE_FLUSH_INTERVAL_SECONDS', 30)
+
+
+class PresenceTracker:
+    """Last heartbeat per online user, plus changes waiting to be written"""
+
+    def __init__(self):
+        self._last_seen = {}
+        # user ID -> (ONLINE / OFFLINE / EXPIRED, last_seen) not yet written
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def heartbeat(self, user_id):
+        now = timezone.now()
+        with self._lock:
+            self._last_seen[user_id] = now
+            self._pending[user_id] = (ONLINE, now)
+        self._start_flusher()
+        return now
+
+    def disconnect(self, user_id):
+        """Mark a user offline straight away, e.g. on logout"""
+        now = timezone.now()
+        with self._lock:
+            self._last_seen.pop(user_id, None)
+            self._pending[user_id] = (OFFLINE, now)
+        self._start_flusher()
+        return now
+
+    def expire(self):
+        """Queue an offline check for users whose heartbeats stopped here"""
+        cutoff = timezone.now() - presence_ttl()
+        with self._lock:
+            expired = [
+                user_id for user_id, last_seen in self._last_seen.items()
+                if last_seen < cutoff
+            ]
+            for user_id in expired:
+                self._pending[user_id] = (EXPIRED, self._last_seen.pop(user_id))
+        return expired
+
+    def online(self, user_ids):
+        """The subset of user_ids that is online"""
+        user_ids = set(user_ids)
+        cutoff = timezone.now() - presence_ttl()
+        with self._lock:
+            online = {
+                user_id for user_id in user_ids
+                if self._last_seen.get(user_id, cutoff) > cutoff
+            }
+        # Heartbeats may have gone to another process
+        unknown = user_ids - online
+        if unknown:
+            online.update(get_user_model().objects.filter(
+                id__in=unknown, is_online=True, last_seen__gt=cutoff
+            ).values_list('id', flat=True))
+        return online
+
+    def is_online(self, user_id):
+        return user_id in self.online([user_id])
+
+    def clear(self):
+        """Forget everything without writing it"""
+        with self._lock:
+            self._last_seen.clear()
+            self._pending.clear()
+
+    def _drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def _restore(self, pending):
+        with self._lock:
+            for user_id, change in pending.items():
+                # Anything newer recorded meanwhile wins
+                self._pending.setdefault(user_id, change)
+
+    def flush(self):
+        """
+        Write pending heartbeats and logouts in one batched UPDATE, and mark
+        users offline whose stored last_seen is past the TTL as well
+        """
+        self.expire()
+        pending = self._drain()
+        if not pending:
+            return 0
+
+        User = get_user_model()
+        users = [
+            User(
+                id=user_id,
+                is_online=state == ONLINE,
+                # Another process may have stored a later heartbeat
+                last_seen=Greatest(
+                    F('last_seen'), Value(last_seen, output_field=models.DateTimeField())
+                )
+            )
+            for user_id, (state, last_seen) in pending.items()
+            if state != EXPIRED
+        ]
+        expired = [user_id for user_id, (state, _) in pending.items() if state == EXPIRED]
+        try:
+            with transaction.atomic():
+                User.objects.bulk_update(users, ['is_online', 'last_seen'], batch_size=500)
+                if expired:
+                    User.objects.filter(
+                        id__in=expired,
+                        last_seen__lt=timezone.now() - presence_ttl()
+                    ).update(is_online=False)
+        except Exception:
+            self._restore(pending)
+            raise
+        return len(pending)
+
+    def _start_flusher(self):
+        interval = flush_interval()
+        if not interval or self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._run, args=(interval,),
+                    name='presence-flusher', daemon=True
+                )
+                self._flusher.start()
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush presence")
+            finally:
+                close_old_connections()
+
+
+presence = PresenceTracker()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        presence.flush()
+    except Exception:
+        logger.exception("Failed to flush presence on exit")
@@ -1,14 +1,21 @@
-from django.test import TestCase
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
 from rest_framework.test import APIClient
 from rest_framework import status
 from rest_framework.reverse import reverse
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from .presence import PresenceTracker, presence
 
 User = get_user_model()
 
+@override_settings(PRESENCE_FLUSH_INTERVAL_SECONDS=0)
 class UserRegistrationTestCase(TestCase):
     def setUp(self):
         self.client = APIClient()
+        self.addCleanup(presence.clear)
 
     def test_user_registration(self):
         """Test if user can register successfully"""
@@ -88,3 +95,68 @@ class UserRegistrationTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('message', response.data)
 
+    def test_users_get_their_own_last_seen(self):
+        """Tests last_seen defaults to creation time, not import time"""
+        first = User.objects.create_user(username='first', password='testpass123')
+        second = User.objects.create_user(username='second', password='testpass123')
+        self.assertNotEqual(first.last_seen, second.last_seen)
+
+    def test_presence_heartbeats_are_buffered(self):
+        """Tests heartbeats stay in memory until flushed in one batch"""
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        friend = User.objects.create_user(username='friend', password='testpass123')
+        stranger = User.objects.create_user(username='stranger', password='testpass123')
+        self.client.force_authenticate(user=user)
+
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('users:heartbeat'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        presence.heartbeat(friend.id)
+        response = self.client.get(
+            reverse('users:presence'), {'ids': f'{user.id},{friend.id},{stranger.id}'}
+        )
+        self.assertEqual(response.data['online'], sorted([user.id, friend.id]))
+        self.assertFalse(User.objects.get(id=user.id).is_online)
+
+        self.assertEqual(presence.flush(), 2)
+        self.assertEqual(
+            set(User.objects.filter(is_online=True).values_list('id', flat=True)),
+            {user.id, friend.id}
+        )
+
+        # Another process only knows what was flushed
+        presence.clear()
+        self.assertEqual(presence.online([user.id, friend.id, stranger.id]), {user.id, friend.id})
+
+        # Heartbeats stopped here and nowhere else saw the user since
+        stale = timezone.now() - timedelta(minutes=5)
+        presence.heartbeat(friend.id)
+        presence._last_seen[friend.id] = stale
+        User.objects.filter(id=friend.id).update(last_seen=stale)
+        self.client.post(reverse('users:logout'))
+        presence.flush()
+        self.assertFalse(User.objects.filter(is_online=True).exists())
+
+    def test_presence_across_workers(self):
+        """Tests one worker's stale view never knocks out another's heartbeats"""
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        worker_a, worker_b, reader = PresenceTracker(), PresenceTracker(), PresenceTracker()
+
+        earlier = worker_a.heartbeat(user.id)
+        later = worker_b.heartbeat(user.id)
+        worker_b.flush()
+        # A's older heartbeat lands after B's, then A sees them stop
+        worker_a.flush()
+        self.assertEqual(User.objects.get(id=user.id).last_seen, later)
+        self.assertLess(earlier, later)
+
+        worker_a.heartbeat(user.id)
+        worker_a._last_seen[user.id] = timezone.now() - timedelta(minutes=5)
+        worker_a._pending.clear()
+        worker_a.flush()
+
+        user.refresh_from_db()
+        self.assertTrue(user.is_online)
+        self.assertEqual(user.last_seen, later)
+        self.assertEqual(reader.online([user.id]), {user.id})
+
@@ -6,6 +6,8 @@ from .views import (
     logout_view,
     ProfileView,
     UserListView,
+    heartbeat,
+    online_users,
 )
 
 app_name = 'users'
@@ -17,4 +19,6 @@ urlpatterns = [
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('profile/', ProfileView.as_view(), name='profile'),
     path('users/', UserListView.as_view(), name='user_list'),
+    path('presence/', online_users, name='presence'),
+    path('presence/heartbeat/', heartbeat, name='heartbeat'),
 ]
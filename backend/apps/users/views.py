@@ -4,16 +4,24 @@ from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
 
+from apps.friendships.graph import friend_graph
+from .presence import presence, presence_ttl
 from .serializers import (
     UserRegistrationSerializer,
     UserProfileSerializer,
     UserListSerializer,
     LoginSerializer
 )
+from config.pagination import KeysetPagination
 
 User = get_user_model()
 
 
+class UserPagination(KeysetPagination):
+    """Paginate users on the primary key"""
+    ordering = ('id',)
+
+
 class RegisterView(generics.CreateAPIView):
     """User registration endpoint"""
     queryset = User.objects.all()
@@ -50,9 +58,9 @@ class LoginView(generics.GenericAPIView):
         # Generate tokens
         refresh = RefreshToken.for_user(user)
 
-        # Update online status
+        # Update online status; written by the presence flusher
         user.is_online = True
-        user.save(update_fields=['is_online', 'last_seen'])
+        user.last_seen = presence.heartbeat(user.id)
 
         return Response({
             'user': UserProfileSerializer(user).data,
@@ -77,6 +85,7 @@ class UserListView(generics.ListAPIView):
     queryset = User.objects.filter(is_active=True)
     serializer_class = UserListSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = UserPagination
 
 
 @api_view(['POST'])
@@ -85,9 +94,43 @@ def logout_view(request):
     "Logs out the user"
     try:
         # Update online status
-        request.user.is_online = False
-        request.user.save(update_fields=['is_online', 'last_seen'])
+        presence.disconnect(request.user.id)
 
         return Response({'message': 'Logged out successfully ☺️'})
     except Exception as error:
-        return Response({'Error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response({'Error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+MAX_PRESENCE_IDS = 500
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def heartbeat(request):
+    """Keep the current user online; clients call this well within the TTL"""
+    presence.heartbeat(request.user.id)
+    return Response({'ttl': int(presence_ttl().total_seconds())})
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def online_users(request):
+    """Which of ?ids=1,2,3 are online; the current user's friends by default"""
+    ids = request.query_params.get('ids')
+    if ids is None:
+        user_ids = list(friend_graph.friends(request.user.id))
+    else:
+        try:
+            user_ids = [int(user_id) for user_id in ids.split(',') if user_id]
+        except ValueError:
+            return Response(
+                {'error': 'ids must be comma separated user IDs'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(user_ids) > MAX_PRESENCE_IDS:
+            return Response(
+                {'error': f'At most {MAX_PRESENCE_IDS} ids per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+    return Response({'online': sorted(presence.online(user_ids))})
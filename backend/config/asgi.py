@@ -2,6 +2,8 @@
 ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Regular requests go to Django; long-lived event streams are routed to
+Channels consumers first.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -13,4 +15,37 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+# Set up Django before importing anything that touches models
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from django.urls import path, re_path  # noqa: E402
+
+from apps.comments.consumers import CommentStreamConsumer  # noqa: E402
+from apps.notifications.consumers import (  # noqa: E402
+    NotificationSocketConsumer,
+    NotificationStreamConsumer,
+    NotificationSyncConsumer
+)
+from apps.users.middleware import JWTAuthMiddleware  # noqa: E402
+
+application = ProtocolTypeRouter({
+    'http': URLRouter([
+        path(
+            'api/posts/<int:post_id>/comments/stream/',
+            JWTAuthMiddleware(CommentStreamConsumer.as_asgi())
+        ),
+        path(
+            'api/notifications/stream/',
+            JWTAuthMiddleware(NotificationStreamConsumer.as_asgi())
+        ),
+        path(
+            'api/notifications/sync/',
+            JWTAuthMiddleware(NotificationSyncConsumer.as_asgi())
+        ),
+        re_path(r'', django_asgi_app),
+    ]),
+    'websocket': JWTAuthMiddleware(URLRouter([
+        path('ws/notifications/', NotificationSocketConsumer.as_asgi()),
+    ])),
+})
@@ -155,10 +155,92 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'config.pagination.KeysetPagination',
     'PAGE_SIZE': 20,
 }
 
+# Home timeline
+# Authors with more friends than this are pulled on read instead of fanned out
+TIMELINE_FANOUT_LIMIT = config('TIMELINE_FANOUT_LIMIT', default=5000, cast=int)
+TIMELINE_BACKFILL_SIZE = 50
+
+# In-process social graph cache
+FRIEND_GRAPH_CACHE_SIZE = 100000  # users
+FRIEND_GRAPH_CACHE_TTL = 300  # seconds
+
+# Precomputed friend suggestions (manage.py compute_friend_suggestions)
+FRIEND_SUGGESTIONS_PER_USER = 50
+
+# Write-behind like counters: buffer deltas in memory, flush in batches.
+# Counts are approximate while on; manage.py reconcile_like_counts repairs drift
+LIKE_COUNTER_BUFFER_ENABLED = config('LIKE_COUNTER_BUFFER_ENABLED', default=False, cast=bool)
+LIKE_COUNTER_FLUSH_INTERVAL_MS = 500
+
+# Channel layer behind live event streams. In-process by default; set
+# REDIS_URL to share events between processes, which the notification
+# worker (manage.py run_notification_worker) needs to reach clients
+ASGI_APPLICATION = 'config.asgi.application'
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [REDIS_URL], 'capacity': 100},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+            'CONFIG': {'capacity': 100},
+        },
+    }
+SSE_KEEPALIVE_SECONDS = 15
+
+# Shared cache; in-process unless REDIS_URL is set
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+# Presence: users stay online this long after a heartbeat, and the
+# coalesced is_online / last_seen changes are written this often
+PRESENCE_TTL_SECONDS = 60
+PRESENCE_FLUSH_INTERVAL_SECONDS = 30
+
+# Likes and comments on the same object within this window share one notification
+NOTIFICATION_COALESCE_WINDOW_HOURS = 24
+
+# Notification retention (manage.py prune_notifications): days each type is
+# kept, None to keep forever. Read ones can be moved to an archive table.
+NOTIFICATION_RETENTION_DAYS = {
+    'default': 90,
+    'post_like': 30,
+    'comment_like': 30,
+    'friend_request': 365,
+    'friend_accept': 365,
+}
+NOTIFICATION_ARCHIVE_ENABLED = config('NOTIFICATION_ARCHIVE_ENABLED', default=False, cast=bool)
+NOTIFICATION_PRUNE_BATCH_SIZE = 1000
+
+# Preference masks fan-out reads from the cache; dropped whenever a row changes.
+# Only with a shared cache (REDIS_URL): in-memory ones are per process, so masks are queried
+NOTIFICATION_PREFERENCE_CACHE_TTL = 3600  # seconds
+
+# Delta sync (api/notifications/sync/); cursors older than the tombstones are refused
+NOTIFICATION_SYNC_PAGE_SIZE = 100
+NOTIFICATION_SYNC_MAX_WAIT = 30  # seconds a long-poll is held
+NOTIFICATION_TOMBSTONE_DAYS = 30
+
 # JWT Settings
 from datetime import timedelta
 SIMPLE_JWT = {
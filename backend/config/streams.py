@@ -0,0 +1,121 @@
+"""
+Server-sent event streams over the channel layer.
+
+A stream is a long-lived HTTP response that joins one or more channel
+layer groups and writes every message sent to them as an SSE event.
+Publishers call publish() from anywhere; the layer configured in
+CHANNEL_LAYERS decides whether that stays in-process or goes through
+Redis to every worker.
+"""
+
+import asyncio
+import json
+
+from asgiref.sync import async_to_sync
+from channels.exceptions import StopConsumer
+from channels.generic.http import AsyncHttpConsumer
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+def layer_is_shared():
+    """
+    Whether events published here reach consumers in other processes; the
+    in-memory layer only delivers within the publishing process
+    """
+    channel_layer = get_channel_layer()
+    return channel_layer is not None and not isinstance(channel_layer, InMemoryChannelLayer)
+
+
+def publish(group, event, data):
+    """Send one SSE event to every stream in group"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(group, {
+        'type': 'stream.event',
+        'event': event,
+        'data': json.dumps(data, cls=DjangoJSONEncoder),
+    })
+
+
+class EventStreamConsumer(AsyncHttpConsumer):
+    """
+    Base consumer for text/event-stream responses.
+
+    Subclasses implement get_groups(), returning the groups to join, or
+    send an error response and return None to refuse the stream.
+    """
+
+    headers = [
+        (b'Content-Type', b'text/event-stream'),
+        (b'Cache-Control', b'no-cache'),
+        # Stop nginx from buffering the stream
+        (b'X-Accel-Buffering', b'no'),
+    ]
+
+    @classmethod
+    def as_asgi(cls, **initkwargs):
+        # Fail while the routes are built, not on the first request
+        if cls.get_groups is EventStreamConsumer.get_groups:
+            raise ImproperlyConfigured(f"{cls.__name__} must implement get_groups()")
+        return super().as_asgi(**initkwargs)
+
+    async def get_groups(self):
+        raise NotImplementedError
+
+    async def send_json_response(self, status, data):
+        await self.send_response(
+            status,
+            json.dumps(data).encode(),
+            headers=[(b'Content-Type', b'application/json')]
+        )
+
+    async def http_request(self, message):
+        # Unlike AsyncHttpConsumer, keep the response open after the request
+        # body is read; the stream ends when the client disconnects
+        if 'body' in message:
+            self.body.append(message['body'])
+        if message.get('more_body'):
+            return
+
+        self.groups = []
+        self.keepalive = None
+        groups = await self.get_groups()
+        if groups is None:
+            raise StopConsumer()
+
+        await self.send_headers(status=200, headers=self.headers)
+        await self.send_body(b': connected\n\n', more_body=True)
+        for group in groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+            self.groups.append(group)
+        await self.on_open()
+        self.keepalive = asyncio.create_task(self.send_keepalives())
+
+    async def on_open(self):
+        """Hook to send initial events once the stream is open"""
+
+    async def send_event(self, event, data):
+        """Write one event; data is already JSON encoded"""
+        await self.send_body(
+            f'event: {event}\ndata: {data}\n\n'.encode(), more_body=True
+        )
+
+    async def send_keepalives(self):
+        # Comment lines keep proxies from closing an idle stream
+        interval = getattr(settings, 'SSE_KEEPALIVE_SECONDS', 15)
+        while True:
+            await asyncio.sleep(interval)
+            await self.send_body(b': keepalive\n\n', more_body=True)
+
+    async def stream_event(self, message):
+        await self.send_event(message['event'], message['data'])
+
+    async def disconnect(self):
+        if getattr(self, 'keepalive', None) is not None:
+            self.keepalive.cancel()
+        for group in getattr(self, 'groups', []):
+            await self.channel_layer.group_discard(group, self.channel_name)
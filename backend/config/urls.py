@@ -26,6 +26,7 @@ urlpatterns = [
     path('api/', include('apps.likes.urls', namespace='likes')),
     path('api/', include('apps.comments.urls', namespace='comments')),
     path('api/', include('apps.friendships.urls', namespace='friendships')),
+    path('api/notifications/', include('apps.notifications.urls', namespace='notifications')),
 ]
 
 # Serve media files in development